@@ -2,13 +2,38 @@ import asyncio
 import aiohttp
 import os
 import re
-import json
+import time
 import requests
 
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from pathlib import Path
 
+from json_codec import (
+    JSONDecodeError,
+    loads,
+    read_json,
+)
+from plate_mirror import (
+    describe_sync,
+    open_mirror,
+)
+from plate_store import (
+    open_store,
+)
+from supabase_client import (
+    SUPABASE_IN_BATCH,
+    SUPABASE_PAGE_SIZE,
+    SupabaseClient,
+    SupabaseError,
+)
+from rate_control import (
+    AdaptiveLimiter,
+    ScanAborted,
+    describe_buckets,
+    get_bucket,
+)
+
 
 # ============================================================
 # KONFIGURATION
@@ -28,29 +53,18 @@ JSON_FILE_PATH.parent.mkdir(
     exist_ok=True,
 )
 
-SUPABASE_URL = os.getenv(
-    "SUPABASE_URL",
-    "",
-).rstrip("/")
-
-SUPABASE_SERVICE_ROLE_KEY = os.getenv(
-    "SUPABASE_SERVICE_ROLE_KEY",
-    "",
-)
-
-
 # ============================================================
 # BILOPSLAG COOKIES
 # ============================================================
 
 try:
-    BILOPSLAG_COOKIES = json.loads(
+    BILOPSLAG_COOKIES = loads(
         os.getenv(
             "BILOPSLAG_COOKIES_JSON",
             "",
         ) or "{}"
     )
-except json.JSONDecodeError:
+except JSONDecodeError:
     print(
         "⚠️ BILOPSLAG_COOKIES_JSON er ugyldig JSON."
     )
@@ -82,6 +96,15 @@ MAX_CONNECTIONS = int(
     )
 )
 
+# MAX_CONNECTIONS er startværdien. Grænsen justeres
+# løbende (AIMD), men aldrig over dette loft.
+MAX_CONNECTIONS_MAX = int(
+    os.getenv(
+        "MAX_CONNECTIONS_MAX",
+        str(MAX_CONNECTIONS * 2),
+    )
+)
+
 REQUEST_TIMEOUT = int(
     os.getenv(
         "REQUEST_TIMEOUT",
@@ -96,7 +119,8 @@ PROGRESS_EVERY = int(
     )
 )
 
-# Lille pause mellem batches.
+# Lille pause mellem batches. Bruges kun, når
+# RATE_LIMIT_RPS/RATE_LIMITS ikke pacer Tjekbil.
 BATCH_PAUSE_SECONDS = float(
     os.getenv(
         "BATCH_PAUSE_SECONDS",
@@ -113,6 +137,25 @@ MAX_HTTP_ERRORS_BEFORE_ABORT = int(
     )
 )
 
+# Kendte plader hentes fra Supabase i keyset-sider.
+# Over 1 deles nøglerummet i så mange intervaller,
+# der hentes samtidigt.
+SUPABASE_FETCH_PARTS = int(
+    os.getenv(
+        "SUPABASE_FETCH_PARTS",
+        "1",
+    )
+)
+
+# Hvordan kendte plader findes:
+# "candidates": kun dagens plader, via plate=in.(...)
+# "full": hele tabellen hentes
+# "auto": det, der kræver færrest requests
+SUPABASE_EXISTENCE_CHECK = os.getenv(
+    "SUPABASE_EXISTENCE_CHECK",
+    "auto",
+).strip().lower()
+
 PLADE_REGEX = re.compile(
     r"^[A-Z]{2}\d{3,5}$"
 )
@@ -225,102 +268,57 @@ def chunks(items, size):
 # ============================================================
 
 def load_existing_data():
-    try:
-        with open(
-            JSON_FILE_PATH,
-            "r",
-            encoding="utf-8",
-        ) as file:
-
-            data = json.load(
-                file
-            )
-
-            if isinstance(
-                data,
-                dict,
-            ):
-                return data
-
-    except (
-        FileNotFoundError,
-        json.JSONDecodeError,
-    ):
-        pass
-
-    return {}
-
-
-def save_to_json(data):
-    JSON_FILE_PATH.parent.mkdir(
-        parents=True,
-        exist_ok=True,
+    return open_store(
+        JSON_FILE_PATH
     )
 
-    with open(
-        JSON_FILE_PATH,
-        "w",
-        encoding="utf-8",
-    ) as file:
 
-        json.dump(
-            data,
-            file,
-            ensure_ascii=False,
-            indent=4,
-            sort_keys=True,
-        )
+def save_to_json(
+    plates,
+):
+    plates.save(
+        JSON_FILE_PATH
+    )
 
 
 # ============================================================
-# SUPABASE HEADERS
+# SUPABASE
 # ============================================================
 
-def supabase_headers(
-    prefer=None,
+def supabase_configured(
+    supabase,
+    message="⚠️ Mangler Supabase credentials.",
 ):
-    headers = {
-        "apikey":
-            SUPABASE_SERVICE_ROLE_KEY,
-
-        "Authorization":
-            (
-                f"Bearer "
-                f"{SUPABASE_SERVICE_ROLE_KEY}"
-            ),
-
-        "Content-Type":
-            "application/json",
-    }
-
-    if prefer:
-        headers[
-            "Prefer"
-        ] = prefer
+    if supabase.configured:
+        return True
 
-    return headers
+    print(
+        message
+    )
+    return False
 
 
 # ============================================================
 # SLET GAMLE PLADER FRA SUPABASE
 # ============================================================
 
-def delete_old_plates_from_supabase():
+async def delete_old_plates_from_supabase(
+    supabase,
+    mirror=None,
+):
     """
     Beholder kun:
     - i dag
     - i går
+
+    Det lokale spejl ryddes op på samme måde.
     """
 
-    if (
-        not SUPABASE_URL
-        or
-        not SUPABASE_SERVICE_ROLE_KEY
+    if not supabase_configured(
+        supabase,
+        "⚠️ Mangler Supabase credentials. "
+        "Springer oprydning over.",
     ):
-        print(
-            "⚠️ Mangler Supabase credentials. "
-            "Springer oprydning over."
-        )
         return False
 
     today = datetime.now(
@@ -335,131 +333,206 @@ def delete_old_plates_from_supabase():
         yesterday.isoformat()
     )
 
-    url = (
-        f"{SUPABASE_URL}"
-        f"/rest/v1/plates"
-        f"?date=lt.{cutoff_date}"
-    )
-
     try:
-        response = requests.delete(
-            url,
-            headers=supabase_headers(),
-            timeout=30,
+        await supabase.delete(
+            "plates",
+            {
+                "date": f"lt.{cutoff_date}",
+            },
         )
 
-        if response.status_code not in (
-            200,
-            204,
-        ):
-            print(
-                "❌ Supabase-oprydning fejlede: "
-                f"{response.status_code} "
-                f"{response.text}"
-            )
-            return False
-
+    except SupabaseError as error:
         print(
-            "🧹 Supabase opryddet."
+            "❌ Supabase-oprydning fejlede: "
+            f"{error}"
         )
+        return False
 
-        print(
-            f"   Beholder kun "
-            f"{yesterday} og {today}."
+    if mirror is not None:
+        mirror.delete_before(
+            cutoff_date
         )
 
-        return True
+    print(
+        "🧹 Supabase opryddet."
+    )
 
-    except Exception as error:
-        print(
-            f"❌ Supabase-oprydningsfejl: "
-            f"{error}"
-        )
-        return False
+    print(
+        f"   Beholder kun "
+        f"{yesterday} og {today}."
+    )
+
+    return True
 
 
 # ============================================================
 # HENT ALLEREDE BEHANDLEDE PLADER
 # ============================================================
 
-def get_existing_plates_from_supabase():
+async def existence_check_mode(
+    supabase,
+    candidates,
+):
     """
-    Henter alle plader som allerede findes i Supabase.
-
-    De springes over før Tjekbil-kaldet.
+    "candidates" eller "full". I auto sammenlignes
+    antal requests: én pr. SUPABASE_IN_BATCH
+    kandidater mod én pr. side af hele tabellen.
     """
 
-    if (
-        not SUPABASE_URL
-        or
-        not SUPABASE_SERVICE_ROLE_KEY
+    if SUPABASE_EXISTENCE_CHECK in (
+        "candidates",
+        "full",
     ):
+        return SUPABASE_EXISTENCE_CHECK
+
+    if candidates is None:
+        return "full"
+
+    try:
+        table_size = await supabase.count(
+            "plates"
+        )
+    except SupabaseError as error:
         print(
-            "⚠️ Mangler Supabase credentials."
+            "⚠️ Kunne ikke tælle plader "
+            f"i Supabase: {error}"
         )
-        return set()
+        table_size = None
 
-    existing = set()
+    # Uden et antal er kandidaterne den sikre grænse.
+    if table_size is None:
+        return "candidates"
 
-    limit = 1000
-    offset = 0
+    candidate_requests = -(
+        -len(candidates)
+        // SUPABASE_IN_BATCH
+    )
+
+    full_requests = -(
+        -table_size
+        // SUPABASE_PAGE_SIZE
+    )
 
-    print("")
     print(
-        "🔎 Henter allerede behandlede "
-        "plader fra Supabase..."
+        f"ℹ️ {len(candidates)} kandidater "
+        f"({candidate_requests} requests) | "
+        f"ca. {table_size} plader i Supabase "
+        f"({full_requests} requests)"
     )
 
-    while True:
-        url = (
-            f"{SUPABASE_URL}"
-            "/rest/v1/plates"
-            "?select=plate"
-            f"&limit={limit}"
-            f"&offset={offset}"
-        )
+    if candidate_requests <= full_requests:
+        return "candidates"
+
+    return "full"
+
+
+async def get_existing_plates_from_supabase(
+    supabase,
+    candidates=None,
+    mirror=None,
+):
+    """
+    Henter de plader som allerede findes i Supabase.
+
+    De springes over før Tjekbil-kaldet. Med mirror
+    synces det lokale spejl (normalt en lille delta),
+    og opslaget sker lokalt. Ellers, eller hvis
+    sync fejler, spørges Supabase direkte; med
+    candidates evt. kun om dem (se
+    existence_check_mode), og resultatet er da de
+    kandidater, der findes.
+
+    Fejler en side efter retries, rejses
+    SupabaseError i stedet for at returnere et
+    ufuldstændigt sæt.
+    """
+
+    if not supabase_configured(
+        supabase
+    ):
+        return set()
 
+    if mirror is not None:
         try:
-            response = requests.get(
-                url,
-                headers=supabase_headers(),
-                timeout=30,
+            result = await mirror.sync(
+                supabase
+            )
+        except SupabaseError as error:
+            print(
+                "⚠️ Spejlet kunne ikke synces; "
+                f"spørger Supabase direkte: {error}"
+            )
+        else:
+            print("")
+            print(
+                f"🪞 Spejl: {describe_sync(result)}"
             )
 
-            if response.status_code != 200:
-                print(
-                    "⚠️ Supabase GET fejlede: "
-                    f"{response.status_code} "
-                    f"{response.text}"
+            started = time.perf_counter()
+
+            existing = (
+                mirror.existing(
+                    candidates
                 )
-                break
+                if candidates is not None
+                else mirror.plates()
+            )
 
-            rows = response.json()
+            print(
+                f"✅ {len(existing)} plader "
+                "er allerede behandlet "
+                f"({(time.perf_counter() - started) * 1000:.1f} ms lokalt)."
+            )
 
-            for row in rows:
-                plate = str(
-                    row.get(
-                        "plate",
-                        "",
-                    )
-                ).upper().strip()
+            return existing
 
-                if plate:
-                    existing.add(
-                        plate
-                    )
+    mode = await existence_check_mode(
+        supabase,
+        candidates,
+    )
 
-            if len(rows) < limit:
-                break
+    print("")
 
-            offset += limit
+    if mode == "candidates":
+        print(
+            f"🔎 Slår {len(candidates)} plader "
+            "op i Supabase..."
+        )
 
-        except Exception as error:
-            print(
-                "⚠️ Fejl ved læsning "
-                f"fra Supabase: {error}"
+        rows = await supabase.select_in(
+            "plates",
+            "plate",
+            candidates,
+            columns="plate",
+        )
+
+    else:
+        print(
+            "🔎 Henter allerede behandlede "
+            "plader fra Supabase..."
+        )
+
+        rows = await supabase.select_by_key(
+            "plates",
+            "plate",
+            columns="plate",
+            parts=SUPABASE_FETCH_PARTS,
+        )
+
+    existing = set()
+
+    for row in rows:
+        plate = str(
+            row.get(
+                "plate",
+                "",
+            )
+        ).upper().strip()
+
+        if plate:
+            existing.add(
+                plate
             )
-            break
 
     print(
         f"✅ {len(existing)} plader "
@@ -473,7 +546,8 @@ def get_existing_plates_from_supabase():
 # SUPABASE BATCH UPLOAD
 # ============================================================
 
-def upload_batch_to_supabase(
+async def upload_batch_to_supabase(
+    supabase,
     entries,
 ):
     if not entries:
@@ -483,27 +557,11 @@ def upload_batch_to_supabase(
         )
         return 0
 
-    if (
-        not SUPABASE_URL
-        or
-        not SUPABASE_SERVICE_ROLE_KEY
+    if not supabase_configured(
+        supabase
     ):
-        print(
-            "⚠️ Mangler Supabase credentials."
-        )
         return 0
 
-    url = (
-        f"{SUPABASE_URL}"
-        "/rest/v1/plates"
-        "?on_conflict=company,plate"
-    )
-
-    headers = supabase_headers(
-        "resolution=ignore-duplicates,"
-        "return=minimal"
-    )
-
     uploaded = 0
 
     for batch in chunks(
@@ -511,38 +569,20 @@ def upload_batch_to_supabase(
         250,
     ):
         try:
-            response = requests.post(
-                url,
-                headers=headers,
-                json=batch,
-                timeout=45,
+            uploaded += await supabase.upsert(
+                "plates",
+                batch,
+                on_conflict="company,plate",
             )
 
-            if response.status_code in (
-                200,
-                201,
-                204,
-            ):
-                uploaded += len(
-                    batch
-                )
-
-                print(
-                    "✅ Supabase batch: "
-                    f"{len(batch)} plader."
-                )
-
-                continue
-
             print(
-                "❌ Supabase upload fejlede: "
-                f"{response.status_code} "
-                f"{response.text}"
+                "✅ Supabase batch: "
+                f"{len(batch)} plader."
             )
 
-        except Exception as error:
+        except SupabaseError as error:
             print(
-                f"❌ Supabase upload-fejl: "
+                "❌ Supabase upload fejlede: "
                 f"{error}"
             )
 
@@ -607,6 +647,12 @@ def hent_registrerede_koeretoejer():
     page = 1
     total_pages = None
 
+    bucket = get_bucket(
+        base_url
+    )
+
+    rate_limited = 0
+
     while True:
         params = {
             **base_params,
@@ -618,6 +664,8 @@ def hent_registrerede_koeretoejer():
                 f"🔎 Henter side {page}"
             )
 
+            bucket.acquire_sync()
+
             response = requests.get(
                 base_url,
                 params=params,
@@ -630,9 +678,24 @@ def hent_registrerede_koeretoejer():
                 f"HTTP {response.status_code}"
             )
 
+            # Med Retry-After venter bucketen, og
+            # samme side hentes igen.
+            if (
+                bucket.observe_response(
+                    response.status_code,
+                    response.headers,
+                )
+                and
+                rate_limited < 3
+            ):
+                rate_limited += 1
+                continue
+
             response.raise_for_status()
 
-            payload = response.json()
+            payload = loads(
+                response.content
+            )
 
             cars = payload.get(
                 "data",
@@ -775,7 +838,7 @@ def hent_registrerede_koeretoejer():
 async def get_insurance_info(
     session,
     vehicle,
-    semaphore,
+    limiter,
 ):
     regnr = vehicle[
         "registration"
@@ -795,7 +858,13 @@ async def get_insurance_info(
         ),
     }
 
-    async with semaphore:
+    bucket = get_bucket(
+        url
+    )
+
+    await bucket.acquire()
+
+    async with limiter.slot() as slot:
         try:
             async with session.get(
                 url,
@@ -805,6 +874,15 @@ async def get_insurance_info(
                 ),
             ) as response:
 
+                slot.observe_status(
+                    response.status
+                )
+
+                bucket.observe_response(
+                    response.status,
+                    response.headers,
+                )
+
                 if response.status != 200:
                     body = await response.text(
                         errors="ignore"
@@ -820,8 +898,8 @@ async def get_insurance_info(
                     }
 
                 try:
-                    payload = await response.json(
-                        content_type=None
+                    payload = await read_json(
+                        response
                     )
 
                 except Exception:
@@ -896,7 +974,11 @@ async def get_insurance_info(
                         ],
                 }
 
-        except asyncio.TimeoutError:
+        except asyncio.TimeoutError as error:
+            slot.observe_error(
+                error
+            )
+
             return {
                 "success": False,
                 "plate": regnr,
@@ -904,6 +986,10 @@ async def get_insurance_info(
             }
 
         except aiohttp.ClientError as error:
+            slot.observe_error(
+                error
+            )
+
             return {
                 "success": False,
                 "plate": regnr,
@@ -913,6 +999,10 @@ async def get_insurance_info(
             }
 
         except Exception as error:
+            slot.observe_error(
+                error
+            )
+
             return {
                 "success": False,
                 "plate": regnr,
@@ -934,12 +1024,14 @@ async def process_insurance_requests(
         return []
 
     connector = aiohttp.TCPConnector(
-        limit=MAX_CONNECTIONS,
+        limit=MAX_CONNECTIONS_MAX,
         ttl_dns_cache=300,
     )
 
-    semaphore = asyncio.Semaphore(
-        MAX_CONNECTIONS
+    limiter = AdaptiveLimiter(
+        "tjekbil",
+        MAX_CONNECTIONS,
+        MAX_CONNECTIONS_MAX,
     )
 
     results = []
@@ -971,11 +1063,103 @@ async def process_insurance_requests(
     )
 
     print(
-        f"Concurrency: {MAX_CONNECTIONS}"
+        f"Concurrency: {MAX_CONNECTIONS} "
+        f"(adaptiv, max {MAX_CONNECTIONS_MAX})"
     )
 
     print("")
 
+    async def lookup(
+        vehicle,
+    ):
+        nonlocal completed
+        nonlocal successful
+        nonlocal failed
+        nonlocal http_error_total
+
+        result = await get_insurance_info(
+            session,
+            vehicle,
+            limiter,
+        )
+
+        completed += 1
+
+        if (
+            result
+            and
+            result.get(
+                "success"
+            )
+        ):
+            successful += 1
+            results.append(
+                result
+            )
+
+        else:
+            failed += 1
+
+            error = (
+                result.get(
+                    "error",
+                    "unknown",
+                )
+                if result
+                else "unknown"
+            )
+
+            error_counts[
+                error
+            ] = (
+                error_counts.get(
+                    error,
+                    0,
+                )
+                + 1
+            )
+
+            if str(
+                error
+            ).startswith(
+                "http_"
+            ):
+                http_error_total += 1
+
+        if (
+            completed % PROGRESS_EVERY == 0
+            or
+            completed >= total
+        ):
+            percent = (
+                completed
+                /
+                total
+                *
+                100
+            )
+
+            print(
+                f"⏳ "
+                f"{completed}/{total} "
+                f"({percent:.1f}%) | "
+                f"med forsikring: "
+                f"{successful} | "
+                f"fejl/uden data: "
+                f"{failed} | "
+                f"grænse: "
+                f"{limiter.current()}"
+            )
+
+        if (
+            http_error_total
+            >=
+            MAX_HTTP_ERRORS_BEFORE_ABORT
+            and
+            successful == 0
+        ):
+            raise ScanAborted
+
     async with aiohttp.ClientSession(
         connector=connector,
     ) as session:
@@ -983,7 +1167,7 @@ async def process_insurance_requests(
         # Kør i små batches, så vi ikke sender
         # tusindvis af requests på én gang.
         batch_size = (
-            MAX_CONNECTIONS * 4
+            MAX_CONNECTIONS_MAX * 4
         )
 
         for batch_number, batch in enumerate(
@@ -993,97 +1177,25 @@ async def process_insurance_requests(
             ),
             start=1,
         ):
-            tasks = [
-                asyncio.create_task(
-                    get_insurance_info(
-                        session,
-                        vehicle,
-                        semaphore,
-                    )
-                )
-                for vehicle in batch
-            ]
-
-            batch_results = (
-                await asyncio.gather(
-                    *tasks
-                )
-            )
-
-            for result in batch_results:
-                completed += 1
-
-                if (
-                    result
-                    and
-                    result.get(
-                        "success"
-                    )
-                ):
-                    successful += 1
-                    results.append(
-                        result
-                    )
-
-                else:
-                    failed += 1
-
-                    error = (
-                        result.get(
-                            "error",
-                            "unknown",
-                        )
-                        if result
-                        else "unknown"
-                    )
-
-                    error_counts[
-                        error
-                    ] = (
-                        error_counts.get(
-                            error,
-                            0,
+            # Hvert resultat tælles, så snart det
+            # kommer. Rammes fejlgrænsen, afbryder
+            # TaskGroup'en resten af batchen, også
+            # requests der allerede er i gang.
+            aborted = False
+
+            try:
+                async with asyncio.TaskGroup() as group:
+                    for vehicle in batch:
+                        group.create_task(
+                            lookup(
+                                vehicle
+                            )
                         )
-                        + 1
-                    )
-
-                    if str(
-                        error
-                    ).startswith(
-                        "http_"
-                    ):
-                        http_error_total += 1
-
-            if (
-                completed % PROGRESS_EVERY == 0
-                or
-                completed >= total
-            ):
-                percent = (
-                    completed
-                    /
-                    total
-                    *
-                    100
-                )
 
-                print(
-                    f"⏳ "
-                    f"{completed}/{total} "
-                    f"({percent:.1f}%) | "
-                    f"med forsikring: "
-                    f"{successful} | "
-                    f"fejl/uden data: "
-                    f"{failed}"
-                )
+            except* ScanAborted:
+                aborted = True
 
-            if (
-                http_error_total
-                >=
-                MAX_HTTP_ERRORS_BEFORE_ABORT
-                and
-                successful == 0
-            ):
+            if aborted:
                 print("")
                 print(
                     "⛔ Stopper Tjekbil-opslag."
@@ -1097,14 +1209,29 @@ async def process_insurance_requests(
 
                 break
 
-            # Skånsom pause mellem batches.
+            # Skånsom pause mellem batches, når
+            # bucketen ikke allerede pacer.
             if (
                 completed < total
+                and
+                not get_bucket(
+                    TJEKBIL_BASE_URL
+                ).rate
             ):
                 await asyncio.sleep(
                     BATCH_PAUSE_SECONDS
                 )
 
+    print("")
+    print(
+        limiter.describe()
+    )
+
+    for line in describe_buckets():
+        print(
+            f"Rate limit: {line}"
+        )
+
     if error_counts:
         print("")
         print(
@@ -1125,7 +1252,10 @@ async def process_insurance_requests(
 # HOVEDPROGRAM
 # ============================================================
 
-async def check_new_registrations():
+async def check_new_registrations(
+    supabase,
+    mirror=None,
+):
 
     # ========================================================
     # 1. FIND REGISTRERINGER
@@ -1146,9 +1276,25 @@ async def check_new_registrations():
     # 2. FIND ALLEREDE BEHANDLEDE
     # ========================================================
 
-    existing_plates = (
-        get_existing_plates_from_supabase()
-    )
+    # Uden det fulde sæt ville Tjekbil blive spurgt
+    # igen om plader, vi allerede har.
+    try:
+        existing_plates = (
+            await get_existing_plates_from_supabase(
+                supabase,
+                [
+                    vehicle["registration"]
+                    for vehicle in vehicles
+                ],
+                mirror,
+            )
+        )
+    except SupabaseError as error:
+        print(
+            "⛔ Kunne ikke hente kendte plader "
+            f"fra Supabase: {error}"
+        )
+        return
 
 
     # ========================================================
@@ -1229,7 +1375,7 @@ async def check_new_registrations():
 
     entries = []
 
-    plates_data = (
+    plates = (
         load_existing_data()
     )
 
@@ -1301,46 +1447,25 @@ async def check_new_registrations():
         # LOKAL JSON
         # --------------------------------------------
 
-        if company not in plates_data:
-            plates_data[
-                company
-            ] = []
+        plates.add(
+            company,
+            {
+                "plate":
+                    plate,
 
-        existing_local = {
-            item.get(
-                "plate"
-            )
-            for item
-            in plates_data[
-                company
-            ]
-        }
-
-        if (
-            plate
-            not in
-            existing_local
-        ):
-            plates_data[
-                company
-            ].append(
-                {
-                    "plate":
-                        plate,
+                "date":
+                    registration_date.isoformat(),
 
-                    "date":
-                        registration_date.isoformat(),
-
-                    "checked":
-                        False,
+                "checked":
+                    False,
 
-                    "premium":
-                        0,
+                "premium":
+                    0,
 
-                    "note":
-                        "",
-                }
-            )
+                "note":
+                    "",
+            },
+        )
 
         print(
             f"✅ {plate} | "
@@ -1381,8 +1506,9 @@ async def check_new_registrations():
     # ========================================================
 
     uploaded = (
-        upload_batch_to_supabase(
-            final_entries
+        await upload_batch_to_supabase(
+            supabase,
+            final_entries,
         )
     )
 
@@ -1393,9 +1519,11 @@ async def check_new_registrations():
 
     if final_entries:
         save_to_json(
-            plates_data
+            plates
         )
 
+    plates.close()
+
 
     # ========================================================
     # RESULTAT
@@ -1448,6 +1576,31 @@ async def check_new_registrations():
 # START
 # ============================================================
 
+async def main():
+    mirror = open_mirror()
+
+    # Én keep-alive pool til alle Supabase-kald i runnet.
+    try:
+        async with SupabaseClient() as supabase:
+            await delete_old_plates_from_supabase(
+                supabase,
+                mirror,
+            )
+
+            await check_new_registrations(
+                supabase,
+                mirror,
+            )
+    finally:
+        if mirror is not None:
+            mirror.close()
+
+    for line in supabase.describe():
+        print(
+            f"Supabase {line}"
+        )
+
+
 if __name__ == "__main__":
 
     print("")
@@ -1460,10 +1613,8 @@ if __name__ == "__main__":
         f"{datetime.now(COPENHAGEN)}"
     )
 
-    delete_old_plates_from_supabase()
-
     asyncio.run(
-        check_new_registrations()
+        main()
     )
 
     print("")
@@ -0,0 +1,412 @@
+import json
+import os
+import sys
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# ============================================================
+# KONFIGURATION
+# ============================================================
+
+# "auto" bruger orjson, når den er installeret.
+# "stdlib" tvinger json-modulet (fx til fejlsøgning).
+JSON_BACKEND = os.getenv(
+    "JSON_BACKEND",
+    "auto",
+).strip().lower()
+
+BACKEND = (
+    "orjson"
+    if orjson and JSON_BACKEND != "stdlib"
+    else "stdlib"
+)
+
+# orjson.JSONDecodeError arver fra denne, så én
+# except fanger fejl fra begge backends.
+JSONDecodeError = json.JSONDecodeError
+
+
+# ============================================================
+# STDLIB
+# ============================================================
+
+def stdlib_loads(
+    data,
+):
+
+    return json.loads(
+        data
+    )
+
+
+def stdlib_dumps(
+    obj,
+    sort_keys=False,
+):
+
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=sort_keys,
+    ).encode(
+        "utf-8"
+    )
+
+
+# ============================================================
+# ORJSON
+# ============================================================
+
+def orjson_loads(
+    data,
+):
+
+    return orjson.loads(
+        data
+    )
+
+
+def orjson_dumps(
+    obj,
+    sort_keys=False,
+):
+
+    # OPT_NON_STR_KEYS: int-nøgler bliver til strenge
+    # som i json-modulet i stedet for at fejle.
+    return orjson.dumps(
+        obj,
+        option=(
+            orjson.OPT_NON_STR_KEYS
+            | (
+                orjson.OPT_SORT_KEYS
+                if sort_keys
+                else 0
+            )
+        ),
+    )
+
+
+BACKENDS = {
+    "stdlib": (
+        stdlib_loads,
+        stdlib_dumps,
+    ),
+}
+
+if orjson:
+
+    BACKENDS["orjson"] = (
+        orjson_loads,
+        orjson_dumps,
+    )
+
+
+# ============================================================
+# API
+# ============================================================
+
+loads, _dumps = BACKENDS[
+    BACKEND
+]
+
+
+def dumps(
+    obj,
+    sort_keys=False,
+    pretty=False,
+):
+    """
+    Kompakt UTF-8 JSON som bytes. Begge backends
+    giver de samme bytes for vores data.
+
+    pretty=True giver 4 mellemrums indrykning via
+    stdlib (orjson kan kun 2).
+    """
+
+    if pretty:
+
+        return json.dumps(
+            obj,
+            ensure_ascii=False,
+            indent=4,
+            sort_keys=sort_keys,
+        ).encode(
+            "utf-8"
+        )
+
+    return _dumps(
+        obj,
+        sort_keys,
+    )
+
+
+def load_file(
+    path,
+):
+
+    with open(
+        path,
+        "rb",
+    ) as file:
+
+        return loads(
+            file.read()
+        )
+
+
+async def read_json(
+    response,
+):
+    """
+    JSON fra en aiohttp-response uden at gå via
+    str, uanset Content-Type.
+    """
+
+    return loads(
+        await response.read()
+    )
+
+
+# ============================================================
+# BENCHMARK
+# ============================================================
+
+def sample_payloads():
+    """
+    Payloads formet som dem, scripts ser pr. plade
+    (vehicle, DMR, Tjekbil) og pr. run (plates.json).
+    """
+
+    vehicle = {
+        "id": 4812345,
+        "registration": "EV12345",
+        "vin": "WVWZZZCDZRW123456",
+        "make": "Volkswagen",
+        "model": "ID.3",
+        "variant": "Pro S 77 kWh",
+        "first_registration_date": "2026-10-17",
+        "fuel_type": "El",
+        "color": "Grå",
+        "status": "Registreret",
+        "status_date": "2026-10-17",
+        "use": "Privat personkørsel",
+        "weight": 1813,
+        "seats": 5,
+    }
+
+    dmr = {
+        "dmr_data": {
+            "insurance_company": "Tryg Forsikring A/S",
+            "insurance_status": "Aktiv",
+            "insurance_created_at": "2026-10-17T00:00:00+02:00",
+            "registration_status": "Registreret",
+            "vehicle_id": 4812345,
+            "inspections": [
+                {
+                    "date": "2026-10-10",
+                    "result": "Godkendt",
+                    "odometer": 12,
+                },
+            ],
+        },
+    }
+
+    tjekbil = {
+        "basic": vehicle,
+        "extended": {
+            "insurance": {
+                "selskab": "Alm. Brand Forsikring A/S",
+                "status": "Aktiv",
+                "oprettet": "2026-10-17",
+            },
+            "taxes": [
+                {
+                    "type": "Ejerafgift",
+                    "amount": 780,
+                    "period": "halvår",
+                },
+            ],
+        },
+    }
+
+    companies = [
+        "Tryg",
+        "Codan",
+        "Topdanmark",
+        "Alm. Brand",
+        "If",
+    ]
+
+    plates = {}
+
+    for number in range(50000):
+
+        plates.setdefault(
+            companies[number % len(companies)],
+            [],
+        ).append(
+            {
+                "checked": False,
+                "date": "2026-10-17",
+                "note": "",
+                "plate": f"EV{10000 + number % 50000:05d}",
+                "premium": 0,
+            }
+        )
+
+    return {
+        "vehicle": vehicle,
+        "dmr": dmr,
+        "tjekbil": tjekbil,
+        "plates.json": plates,
+    }
+
+
+def time_call(
+    function,
+    argument,
+    budget=0.3,
+):
+    """
+    Mikrosekunder pr. kald.
+    """
+
+    calls = 0
+
+    started = time.perf_counter()
+
+    while True:
+
+        function(
+            argument
+        )
+
+        calls += 1
+
+        elapsed = (
+            time.perf_counter()
+            - started
+        )
+
+        if elapsed >= budget:
+
+            return (
+                elapsed
+                / calls
+                * 1_000_000
+            )
+
+
+def benchmark():
+
+    payloads = sample_payloads()
+
+    results = {}
+
+    for name, (
+        backend_loads,
+        backend_dumps,
+    ) in BACKENDS.items():
+
+        for label, payload in payloads.items():
+
+            body = stdlib_dumps(
+                payload,
+                sort_keys=True,
+            )
+
+            results[
+                (name, label)
+            ] = (
+                time_call(
+                    backend_loads,
+                    body,
+                ),
+                time_call(
+                    lambda obj: backend_dumps(
+                        obj,
+                        True,
+                    ),
+                    payload,
+                ),
+            )
+
+    print(
+        f"Aktiv backend: {BACKEND} "
+        f"(orjson {'installeret' if orjson else 'ikke installeret'})"
+    )
+
+    print("")
+
+    print(
+        f"{'payload':<12} {'backend':<8} "
+        f"{'loads µs':>12} {'dumps µs':>12}"
+    )
+
+    for (name, label), (
+        decode,
+        encode,
+    ) in results.items():
+
+        print(
+            f"{label:<12} {name:<8} "
+            f"{decode:>12.1f} {encode:>12.1f}"
+        )
+
+    if "orjson" not in BACKENDS:
+
+        return
+
+    # Pr. plade: vehicle-attributten og DMR- eller
+    # Tjekbil-svaret afkodes.
+    per_plate = {
+
+        name: sum(
+
+            results[
+                (name, label)
+            ][0]
+
+            for label in (
+                "vehicle",
+                "dmr",
+            )
+        )
+
+        for name in BACKENDS
+    }
+
+    print("")
+
+    print(
+        "Pr. plade (vehicle + DMR): "
+        f"stdlib {per_plate['stdlib']:.1f} µs | "
+        f"orjson {per_plate['orjson']:.1f} µs | "
+        f"sparet {per_plate['stdlib'] - per_plate['orjson']:.1f} µs"
+    )
+
+
+# ============================================================
+# START
+# ============================================================
+
+if __name__ == "__main__":
+
+    if sys.argv[1:2] not in (
+        [],
+        ["benchmark"],
+    ):
+
+        print(
+            "Brug: python json_codec.py [benchmark]"
+        )
+
+        sys.exit(1)
+
+    benchmark()
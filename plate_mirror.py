@@ -0,0 +1,572 @@
+import os
+import sqlite3
+import time
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from scan_state import (
+    META_SCHEMA,
+    STATE_DIR,
+    SQLiteMeta,
+)
+
+from supabase_client import (
+    SupabaseError,
+)
+
+
+# ============================================================
+# KONFIGURATION
+# ============================================================
+
+SUPABASE_MIRROR_PATH = Path(
+    os.getenv(
+        "SUPABASE_MIRROR_PATH",
+        STATE_DIR / "supabase_plates.sqlite3",
+    )
+)
+
+# Kolonne, der stiger for nye rækker. Kun rækker fra
+# og med vandmærket hentes. Tom (standard) slår delta
+# og dermed spejlet fra (se SUPABASE_MIRROR).
+#
+# Delta kræver en kolonne, som scripts ikke selv
+# skriver, fx:
+#
+#   alter table plates add column
+#       created_at timestamptz not null default now();
+#
+# og SUPABASE_MIRROR_WATERMARK=created_at. Mangler
+# kolonnen, falder sync tilbage til fuld resync.
+SUPABASE_MIRROR_WATERMARK = os.getenv(
+    "SUPABASE_MIRROR_WATERMARK",
+    "",
+).strip()
+
+# Lokal SQLite-kopi af Supabase-tabellen plates, så
+# et run kan slå kendte plader op uden at hente dem.
+# Kun slået til, når der er et vandmærke: uden delta
+# henter hver sync hele tabellen, og så er
+# existence_check_mode (kandidatopslag) billigere.
+SUPABASE_MIRROR = os.getenv(
+    "SUPABASE_MIRROR",
+    (
+        "1"
+        if SUPABASE_MIRROR_WATERMARK
+        else "0"
+    ),
+).strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Vandmærket trækkes så mange sekunder tilbage, så
+# rækker, der committes lidt efter deres
+# created_at, ikke smutter forbi.
+SUPABASE_MIRROR_OVERLAP_SECONDS = int(
+    os.getenv(
+        "SUPABASE_MIRROR_OVERLAP_SECONDS",
+        "300",
+    )
+)
+
+# Samtidige key-intervaller ved fuld resync.
+SUPABASE_MIRROR_FETCH_PARTS = int(
+    os.getenv(
+        "SUPABASE_MIRROR_FETCH_PARTS",
+        "4",
+    )
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plates (
+    company TEXT NOT NULL,
+    plate TEXT NOT NULL,
+    date TEXT,
+    watermark,
+    PRIMARY KEY (company, plate)
+);
+
+CREATE INDEX IF NOT EXISTS plates_plate
+    ON plates (plate);
+"""
+
+
+# ============================================================
+# SPEJL
+# ============================================================
+
+class PlateMirror(
+    SQLiteMeta,
+):
+    """
+    Supabase-tabellen plates som SQLite med indeks
+    på plate. sync henter kun rækker nyere end
+    vandmærket og resyncer helt, når antallet af
+    rækker ikke stemmer med Supabase (fx efter
+    sletninger, spejlet ikke kender til).
+    """
+
+    def __init__(
+        self,
+        path=None,
+        watermark=None,
+    ):
+
+        self.path = Path(
+            path
+            or SUPABASE_MIRROR_PATH
+        )
+
+        self.watermark_column = (
+            SUPABASE_MIRROR_WATERMARK
+            if watermark is None
+            else watermark
+        )
+
+        self.path.parent.mkdir(
+            parents=True,
+            exist_ok=True,
+        )
+
+        self.connection = sqlite3.connect(
+            self.path
+        )
+
+        self.connection.executescript(
+            SCHEMA
+            + META_SCHEMA
+        )
+
+    def close(self):
+
+        self.connection.close()
+
+    def __len__(self):
+
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM plates"
+        ).fetchone()[0]
+
+    def __contains__(
+        self,
+        plate,
+    ):
+
+        return self.connection.execute(
+            "SELECT 1 FROM plates WHERE plate = ? LIMIT 1",
+            (plate,),
+        ).fetchone() is not None
+
+    def contains(
+        self,
+        company,
+        plate,
+    ):
+
+        return self.connection.execute(
+            "SELECT 1 FROM plates "
+            "WHERE company = ? AND plate = ?",
+            (
+                company,
+                plate,
+            ),
+        ).fetchone() is not None
+
+    def existing(
+        self,
+        plates,
+    ):
+        """
+        De af plates, der findes i spejlet.
+        """
+
+        return {
+
+            plate
+
+            for plate in plates
+
+            if plate in self
+        }
+
+    def plates(self):
+
+        return {
+
+            plate
+
+            for (plate,) in self.connection.execute(
+                "SELECT DISTINCT plate FROM plates"
+            )
+        }
+
+    def plate_dates(
+        self,
+        prefixes,
+    ):
+        """
+        plate -> seneste date for plader, der starter
+        med et af prefixes. Intervalopslag, så
+        indekset på plate bruges.
+        """
+
+        found = {}
+
+        for prefix in prefixes:
+
+            upper = (
+                prefix[:-1]
+                + chr(ord(prefix[-1]) + 1)
+            )
+
+            for plate, date in self.connection.execute(
+                "SELECT plate, MAX(date) FROM plates "
+                "WHERE plate >= ? AND plate < ? "
+                "GROUP BY plate",
+                (
+                    prefix,
+                    upper,
+                ),
+            ):
+
+                found[
+                    plate
+                ] = date
+
+        return found
+
+    # --------------------------------------------------------
+    # META
+    # --------------------------------------------------------
+
+    def since(self):
+        """
+        Værdien, deltaen hentes fra: vandmærket minus
+        overlap. None betyder fuld resync.
+        """
+
+        if not self.watermark_column:
+
+            return None
+
+        if self.get_meta(
+            "watermark_column"
+        ) != self.watermark_column:
+
+            return None
+
+        watermark = self.get_meta(
+            "watermark"
+        )
+
+        if not watermark:
+
+            return None
+
+        try:
+
+            return (
+                datetime.fromisoformat(
+                    watermark
+                )
+                -
+                timedelta(
+                    seconds=SUPABASE_MIRROR_OVERLAP_SECONDS
+                )
+            ).isoformat()
+
+        except ValueError:
+
+            # Ikke et tidsstempel (fx et id); brug
+            # det som det er.
+            return watermark
+
+    # --------------------------------------------------------
+    # SKRIVNING
+    # --------------------------------------------------------
+
+    def columns(self):
+
+        return ",".join(
+            [
+                "company",
+                "plate",
+                "date",
+            ]
+            + (
+                [self.watermark_column]
+                if self.watermark_column
+                else []
+            )
+        )
+
+    def merge(
+        self,
+        rows,
+    ):
+        """
+        Indsætter eller opdaterer rækker fra Supabase
+        og flytter vandmærket frem.
+        """
+
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO plates "
+            "(company, plate, date, watermark) "
+            "VALUES (?, ?, ?, ?)",
+            (
+
+                (
+                    row["company"],
+                    row["plate"],
+                    row.get("date"),
+                    (
+                        row.get(self.watermark_column)
+                        if self.watermark_column
+                        else None
+                    ),
+                )
+
+                for row in rows
+            ),
+        )
+
+        if not self.watermark_column:
+
+            return
+
+        (highest,) = self.connection.execute(
+            "SELECT MAX(watermark) FROM plates"
+        ).fetchone()
+
+        if highest:
+
+            self.set_meta(
+                "watermark",
+                highest,
+            )
+
+            self.set_meta(
+                "watermark_column",
+                self.watermark_column,
+            )
+
+    def replace_all(
+        self,
+        rows,
+    ):
+
+        with self.connection:
+
+            self.connection.execute(
+                "DELETE FROM plates"
+            )
+
+            self.connection.execute(
+                "DELETE FROM meta WHERE key = 'watermark'"
+            )
+
+            self.merge(
+                rows
+            )
+
+    def delete_before(
+        self,
+        date,
+    ):
+        """
+        Samme oprydning som i Supabase (date < date),
+        så antallet stadig stemmer bagefter.
+        """
+
+        with self.connection:
+
+            return self.connection.execute(
+                "DELETE FROM plates WHERE date < ?",
+                (date,),
+            ).rowcount
+
+    # --------------------------------------------------------
+    # SYNC
+    # --------------------------------------------------------
+
+    async def full_sync(
+        self,
+        supabase,
+    ):
+
+        rows = await supabase.select_by_key(
+            "plates",
+            (
+                "plate",
+                "company",
+            ),
+            columns=self.columns(),
+            parts=SUPABASE_MIRROR_FETCH_PARTS,
+        )
+
+        self.replace_all(
+            rows
+        )
+
+        return len(
+            rows
+        )
+
+    async def sync(
+        self,
+        supabase,
+    ):
+        """
+        Bringer spejlet à jour. Returnerer
+        {"mode", "rows", "total", "seconds"}; rejser
+        SupabaseError, hvis Supabase ikke svarer.
+        """
+
+        started = time.perf_counter()
+
+        try:
+
+            mode, fetched = await self.fetch(
+                supabase
+            )
+
+        except SupabaseError as error:
+
+            # 400: vandmærke-kolonnen findes ikke i
+            # tabellen. Resten af runnet klarer sig
+            # uden delta.
+            if (
+                error.status != 400
+                or
+                not self.watermark_column
+            ):
+
+                raise
+
+            print(
+                "⚠️ Supabase kender ikke kolonnen "
+                f"{self.watermark_column}; "
+                "spejlet henter hele tabellen."
+            )
+
+            self.watermark_column = ""
+
+            mode = "full"
+
+            fetched = await self.full_sync(
+                supabase
+            )
+
+        return {
+            "mode": mode,
+            "rows": fetched,
+            "total": len(self),
+            "seconds": time.perf_counter() - started,
+        }
+
+    async def fetch(
+        self,
+        supabase,
+    ):
+        """
+        Delta fra vandmærket, eller fuld resync uden
+        vandmærke eller ved forkert antal. Returnerer
+        (mode, rækker hentet).
+        """
+
+        since = self.since()
+
+        mode = "delta"
+
+        if since is None:
+
+            mode = "full"
+
+            fetched = await self.full_sync(
+                supabase
+            )
+
+        else:
+
+            rows = await supabase.select_all(
+                "plates",
+                columns=self.columns(),
+                filters={
+                    self.watermark_column: f"gte.{since}",
+                },
+                order=(
+                    f"{self.watermark_column}.asc,"
+                    "plate.asc,"
+                    "company.asc"
+                ),
+            )
+
+            with self.connection:
+
+                self.merge(
+                    rows
+                )
+
+            fetched = len(
+                rows
+            )
+
+            remote = await supabase.count(
+                "plates",
+                exact=True,
+            )
+
+            if remote != len(self):
+
+                print(
+                    "🔄 Spejlet har "
+                    f"{len(self)} plader, Supabase {remote}; "
+                    "henter hele tabellen."
+                )
+
+                mode = "full"
+
+                fetched = await self.full_sync(
+                    supabase
+                )
+
+        return (
+            mode,
+            fetched,
+        )
+
+
+def open_mirror(
+    path=None,
+):
+    """
+    PlateMirror, eller None hvis spejlet er slået fra.
+    """
+
+    if not SUPABASE_MIRROR:
+
+        return None
+
+    return PlateMirror(
+        path
+    )
+
+
+def describe_sync(
+    result,
+):
+
+    mode = (
+        "fuld resync"
+        if result["mode"] == "full"
+        else "delta"
+    )
+
+    return (
+        f"{mode}: {result['rows']} rækker hentet | "
+        f"{result['total']} plader lokalt | "
+        f"{result['seconds'] * 1000:.0f} ms"
+    )
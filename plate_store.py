@@ -0,0 +1,1285 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import sys
+
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from json_codec import (
+    JSONDecodeError,
+    dumps,
+    loads,
+)
+from scan_state import (
+    COPENHAGEN,
+    META_SCHEMA,
+    STATE_DIR,
+    SQLiteMeta,
+    replace_file,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# ============================================================
+# KONFIGURATION
+# ============================================================
+
+# "sqlite": pladerne ligger i en SQLite-database, og
+# plates.json eksporteres derfra ved hvert run.
+# "json": plates.json skrives helt om ved hvert run.
+# "journal": hvert run tilføjer kun sine nye plader til
+# plates.journal.jsonl, som foldes ind i plates.json
+# (snapshot), når journalen bliver for stor.
+PLATES_STORAGE = os.getenv(
+    "PLATES_STORAGE",
+    "sqlite",
+).strip().lower()
+
+# Databasen til sqlite. Som standard
+# .scan_state/<navn på plates.json>.sqlite3, så den
+# ikke havner i public/.
+PLATES_DB_PATH = os.getenv(
+    "PLATES_DB_PATH",
+    "",
+)
+
+# Nye plader skrives i én transaktion pr. så mange.
+PLATES_DB_BATCH = int(
+    os.getenv(
+        "PLATES_DB_BATCH",
+        "500",
+    )
+)
+
+# sqlite: plader med date ældre end så mange dage
+# slettes ved save. 0 beholder alt.
+PLATES_RETENTION_DAYS = int(
+    os.getenv(
+        "PLATES_RETENTION_DAYS",
+        "0",
+    )
+)
+
+# plates.json skrives kompakt. Med PLATES_JSON_PRETTY=1
+# skrives den med indrykning (til fejlsøgning).
+PLATES_JSON_PRETTY = os.getenv(
+    "PLATES_JSON_PRETTY",
+    "0",
+).strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Skriv også plates.json.gz og plates.json.br (kræver
+# brotli), så sitet kan levere dem direkte.
+PLATES_PRECOMPRESS = os.getenv(
+    "PLATES_PRECOMPRESS",
+    "1",
+).strip().lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Journalen komprimeres ind i snapshot over denne størrelse.
+PLATES_JOURNAL_MAX_BYTES = int(
+    os.getenv(
+        "PLATES_JOURNAL_MAX_BYTES",
+        str(1024 * 1024),
+    )
+)
+
+
+# ============================================================
+# SNAPSHOT
+# ============================================================
+
+def read_snapshot(
+    path,
+):
+
+    try:
+
+        with open(
+            path,
+            "rb",
+        ) as file:
+
+            data = loads(
+                file.read()
+            )
+
+    except (
+        FileNotFoundError,
+        JSONDecodeError,
+    ):
+
+        return {}
+
+    if not isinstance(
+        data,
+        dict,
+    ):
+
+        return {}
+
+    return data
+
+
+def encode_snapshot(
+    data,
+):
+
+    return dumps(
+        data,
+        sort_keys=True,
+        pretty=PLATES_JSON_PRETTY,
+    )
+
+
+def gzip_compress(
+    body,
+):
+
+    # mtime=0 giver samme bytes for samme indhold.
+    return gzip.compress(
+        body,
+        compresslevel=9,
+        mtime=0,
+    )
+
+
+def compressors():
+    """
+    (endelse, funktion) for de komprimerede kopier,
+    der kan laves i dette miljø.
+    """
+
+    if not PLATES_PRECOMPRESS:
+
+        return {}
+
+    found = {
+        ".gz": gzip_compress,
+    }
+
+    if brotli:
+
+        found[".br"] = brotli.compress
+
+    return found
+
+
+def write_snapshot(
+    path,
+    data,
+):
+    """
+    Skriver plates.json (og .gz/.br) atomisk, men kun
+    når indholdet har ændret sig. Returnerer True,
+    hvis noget blev skrevet.
+    """
+
+    return write_snapshot_body(
+        path,
+        encode_snapshot(
+            data
+        ),
+    )
+
+
+def write_snapshot_body(
+    path,
+    body,
+):
+    """
+    Som write_snapshot, men med færdigkodede bytes.
+    """
+
+    path = Path(
+        path
+    )
+
+    path.parent.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    try:
+
+        unchanged = (
+            path.read_bytes()
+            == body
+        )
+
+    except FileNotFoundError:
+
+        unchanged = False
+
+    written = False
+
+    active = compressors()
+
+    for suffix in (
+        ".gz",
+        ".br",
+    ):
+
+        sibling = path.with_name(
+            f"{path.name}{suffix}"
+        )
+
+        # En kopi, der ikke kan laves nu, slettes,
+        # så en gammel version ikke bliver leveret.
+        if suffix not in active:
+
+            sibling.unlink(
+                missing_ok=True
+            )
+
+            continue
+
+        # Kopier skrives også, hvis de mangler.
+        if unchanged and sibling.exists():
+
+            continue
+
+        replace_file(
+            sibling,
+            active[suffix](
+                body
+            ),
+        )
+
+        written = True
+
+    if not unchanged:
+
+        replace_file(
+            path,
+            body,
+        )
+
+        written = True
+
+    return written
+
+
+# ============================================================
+# JOURNAL
+# ============================================================
+
+def journal_path(
+    path,
+):
+
+    path = Path(
+        path
+    )
+
+    return path.with_name(
+        f"{path.stem}.journal.jsonl"
+    )
+
+
+def read_journal(
+    path,
+):
+    """
+    Rækkerne i journalen. En halv linje fra et run,
+    der døde midt i en skrivning, springes over.
+    """
+
+    try:
+
+        with open(
+            journal_path(path),
+            "rb",
+        ) as file:
+
+            for line in file:
+
+                try:
+
+                    record = loads(
+                        line
+                    )
+
+                except JSONDecodeError:
+
+                    continue
+
+                if (
+                    isinstance(
+                        record,
+                        dict,
+                    )
+                    and
+                    record.get("company")
+                    and
+                    record.get("plate")
+                ):
+
+                    yield record
+
+    except FileNotFoundError:
+
+        return
+
+
+def append_journal(
+    path,
+    records,
+):
+    """
+    Tilføjer records ({"company", **entry}) i én
+    skrivning og fsync'er, så et nedbrud højst
+    koster den linje, der var ved at blive skrevet.
+    """
+
+    if not records:
+
+        return
+
+    path = journal_path(
+        path
+    )
+
+    path.parent.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    lines = b"".join(
+
+        dumps(
+            record,
+            sort_keys=True,
+        )
+        + b"\n"
+
+        for record in records
+    )
+
+    with open(
+        path,
+        "a+b",
+    ) as file:
+
+        # Efter en halv linje starter vi på en ny,
+        # så den næste række ikke klistres på.
+        if file.tell():
+
+            file.seek(
+                -1,
+                os.SEEK_END,
+            )
+
+            if file.read(1) != b"\n":
+
+                lines = b"\n" + lines
+
+        file.write(
+            lines
+        )
+
+        file.flush()
+
+        os.fsync(
+            file.fileno()
+        )
+
+
+# ============================================================
+# PLATE STORE
+# ============================================================
+
+class PlateStore:
+    """
+    company -> entries (samme form som plates.json)
+    med et indeks over (company, plate), så opslag
+    og indsættelse er O(1).
+
+    Plader tilføjet siden indlæsning huskes, så
+    save kun journaliserer dem.
+    """
+
+    def __init__(
+        self,
+        data=None,
+    ):
+
+        self.data = {}
+
+        self.index = set()
+
+        self.new = []
+
+        for company, entries in (
+            data or {}
+        ).items():
+
+            for entry in entries:
+
+                self.insert(
+                    company,
+                    entry,
+                )
+
+    @classmethod
+    def load(
+        cls,
+        path,
+    ):
+        """
+        Snapshot plus journal.
+        """
+
+        store = cls(
+            read_snapshot(
+                path
+            )
+        )
+
+        for record in read_journal(
+            path
+        ):
+
+            store.insert(
+                record["company"],
+                {
+                    key: value
+
+                    for key, value in record.items()
+
+                    if key != "company"
+                },
+            )
+
+        return store
+
+    def __contains__(
+        self,
+        key,
+    ):
+
+        return key in self.index
+
+    def __len__(self):
+
+        return len(
+            self.index
+        )
+
+    def contains(
+        self,
+        company,
+        plate,
+    ):
+
+        return (
+            company,
+            plate,
+        ) in self.index
+
+    def insert(
+        self,
+        company,
+        entry,
+    ):
+        """
+        Indsætter uden at markere som ny. Returnerer
+        False, hvis pladen allerede findes.
+        """
+
+        key = (
+            company,
+            entry.get(
+                "plate"
+            ),
+        )
+
+        if key in self.index:
+
+            return False
+
+        self.index.add(
+            key
+        )
+
+        self.data.setdefault(
+            company,
+            [],
+        ).append(
+            entry
+        )
+
+        return True
+
+    def add(
+        self,
+        company,
+        entry,
+    ):
+        """
+        Tilføjer en ny plade. Returnerer False,
+        hvis den allerede findes.
+        """
+
+        if not self.insert(
+            company,
+            entry,
+        ):
+
+            return False
+
+        self.new.append(
+            {
+                "company": company,
+                **entry,
+            }
+        )
+
+        return True
+
+    def extend(
+        self,
+        records,
+    ):
+        """
+        Tilføjer records ({"company", **entry}) og
+        returnerer dem, der var nye.
+        """
+
+        return [
+
+            record
+
+            for record in records
+
+            if self.add(
+                record["company"],
+                {
+                    key: value
+
+                    for key, value in record.items()
+
+                    if key != "company"
+                },
+            )
+        ]
+
+    def to_dict(self):
+
+        return self.data
+
+    def close(self):
+
+        # Intet at lukke; findes, så kaldere kan
+        # behandle begge backends ens.
+        return
+
+    def save(
+        self,
+        path,
+    ):
+
+        save_plates(
+            path,
+            self.data,
+            self.new,
+        )
+
+        self.new = []
+
+
+# ============================================================
+# SQLITE
+# ============================================================
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plates (
+    company TEXT NOT NULL,
+    plate TEXT NOT NULL,
+    date TEXT,
+    entry BLOB NOT NULL,
+    PRIMARY KEY (company, plate)
+);
+
+CREATE INDEX IF NOT EXISTS plates_plate
+    ON plates (plate);
+
+CREATE INDEX IF NOT EXISTS plates_date
+    ON plates (date);
+"""
+
+
+def db_path(
+    path,
+):
+
+    if PLATES_DB_PATH:
+
+        return Path(
+            PLATES_DB_PATH
+        )
+
+    return (
+        STATE_DIR
+        / f"{Path(path).stem}.sqlite3"
+    )
+
+
+class SQLitePlateStore(
+    SQLiteMeta,
+):
+    """
+    Samme interface som PlateStore, men over SQLite
+    (WAL) med indeks på (company, plate), plate og
+    date. Opslag, indsættelse og oprydning rører
+    kun de berørte rækker.
+
+    Nye plader samles og skrives i én transaktion
+    pr. PLATES_DB_BATCH. Hver entry gemmes som den
+    kodede JSON, så eksporten blot sætter bytes
+    sammen.
+    """
+
+    def __init__(
+        self,
+        path,
+    ):
+
+        self.path = Path(
+            path
+        )
+
+        self.path.parent.mkdir(
+            parents=True,
+            exist_ok=True,
+        )
+
+        # timeout: EN og EP kan skrive samtidigt.
+        self.connection = sqlite3.connect(
+            self.path,
+            timeout=30,
+        )
+
+        self.connection.execute(
+            "PRAGMA journal_mode=WAL"
+        )
+
+        self.connection.execute(
+            "PRAGMA synchronous=NORMAL"
+        )
+
+        self.connection.executescript(
+            SCHEMA
+            + META_SCHEMA
+        )
+
+        # Tilføjet, men endnu ikke skrevet.
+        self.pending = {}
+
+        self.new = []
+
+    @classmethod
+    def load(
+        cls,
+        path,
+    ):
+        """
+        Databasen for plates.json på path. Er filen
+        ændret siden sidste eksport (eller ny),
+        genopbygges tabellen fra den først.
+        """
+
+        store = cls(
+            db_path(
+                path
+            )
+        )
+
+        store.import_snapshot(
+            path
+        )
+
+        return store
+
+    def close(self):
+
+        self.flush()
+
+        self.connection.close()
+
+    def __contains__(
+        self,
+        key,
+    ):
+
+        return self.contains(
+            *key
+        )
+
+    def __len__(self):
+
+        self.flush()
+
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM plates"
+        ).fetchone()[0]
+
+    def contains(
+        self,
+        company,
+        plate,
+    ):
+
+        if (
+            company,
+            plate,
+        ) in self.pending:
+
+            return True
+
+        return self.connection.execute(
+            "SELECT 1 FROM plates "
+            "WHERE company = ? AND plate = ?",
+            (
+                company,
+                plate,
+            ),
+        ).fetchone() is not None
+
+    def insert(
+        self,
+        company,
+        entry,
+    ):
+        """
+        Indsætter uden at markere som ny. Returnerer
+        False, hvis pladen allerede findes.
+        """
+
+        if self.contains(
+            company,
+            entry.get(
+                "plate"
+            ),
+        ):
+
+            return False
+
+        self.pending[
+            (
+                company,
+                entry.get(
+                    "plate"
+                ),
+            )
+        ] = entry
+
+        if len(
+            self.pending
+        ) >= PLATES_DB_BATCH:
+
+            self.flush()
+
+        return True
+
+    def add(
+        self,
+        company,
+        entry,
+    ):
+        """
+        Tilføjer en ny plade. Returnerer False,
+        hvis den allerede findes.
+        """
+
+        if not self.insert(
+            company,
+            entry,
+        ):
+
+            return False
+
+        self.new.append(
+            {
+                "company": company,
+                **entry,
+            }
+        )
+
+        return True
+
+    def extend(
+        self,
+        records,
+    ):
+        """
+        Tilføjer records ({"company", **entry}) og
+        returnerer dem, der var nye.
+        """
+
+        return [
+
+            record
+
+            for record in records
+
+            if self.add(
+                record["company"],
+                {
+                    key: value
+
+                    for key, value in record.items()
+
+                    if key != "company"
+                },
+            )
+        ]
+
+    def write(
+        self,
+        entries,
+    ):
+        """
+        INSERT OR IGNORE af (company, entry) uden egen
+        transaktion.
+        """
+
+        return self.connection.executemany(
+            "INSERT OR IGNORE INTO plates "
+            "(company, plate, date, entry) "
+            "VALUES (?, ?, ?, ?)",
+            (
+
+                (
+                    company,
+                    entry.get(
+                        "plate"
+                    ),
+                    entry.get(
+                        "date"
+                    ),
+                    dumps(
+                        entry,
+                        sort_keys=True,
+                    ),
+                )
+
+                for company, entry in entries
+            ),
+        ).rowcount
+
+    def flush(self):
+        """
+        Skriver ventende plader i én transaktion.
+        """
+
+        if not self.pending:
+
+            return
+
+        with self.connection:
+
+            self.write(
+                (
+                    company,
+                    entry,
+                )
+
+                for (
+                    company,
+                    _,
+                ), entry in self.pending.items()
+            )
+
+        self.pending = {}
+
+    def prune(
+        self,
+        before,
+    ):
+        """
+        Sletter plader med date < before via
+        indekset på date. Returnerer antallet.
+        """
+
+        self.flush()
+
+        with self.connection:
+
+            return self.connection.execute(
+                "DELETE FROM plates WHERE date < ?",
+                (before,),
+            ).rowcount
+
+    def rows(self):
+        """
+        (company, kodet entry) i indsættelsesrækkefølge.
+        """
+
+        self.flush()
+
+        return self.connection.execute(
+            "SELECT company, entry FROM plates "
+            "ORDER BY rowid"
+        )
+
+    def to_dict(self):
+
+        data = {}
+
+        for company, entry in self.rows():
+
+            data.setdefault(
+                company,
+                [],
+            ).append(
+                loads(
+                    entry
+                )
+            )
+
+        return data
+
+    def export_snapshot(self):
+        """
+        plates.json som bytes. Kompakt format sættes
+        sammen af de gemte entries uden at afkode
+        dem; resultatet er det samme som
+        encode_snapshot(self.to_dict()).
+        """
+
+        if PLATES_JSON_PRETTY:
+
+            return encode_snapshot(
+                self.to_dict()
+            )
+
+        companies = {}
+
+        for company, entry in self.rows():
+
+            companies.setdefault(
+                company,
+                [],
+            ).append(
+                bytes(
+                    entry
+                )
+            )
+
+        return b"{" + b",".join(
+
+            dumps(company)
+            + b":["
+            + b",".join(entries)
+            + b"]"
+
+            for company, entries in sorted(
+                companies.items()
+            )
+        ) + b"}"
+
+    def import_snapshot(
+        self,
+        path,
+    ):
+        """
+        Genopbygger tabellen fra plates.json (og en
+        evt. journal), hvis filen ikke er den,
+        databasen selv eksporterede sidst (fx en ny
+        checkout, en hånd-redigeret fil eller en fil
+        skrevet i json-mode). Filen vinder: ændrede
+        og slettede entries følger med, og en slettet
+        fil tømmer tabellen. Returnerer antal plader.
+        """
+
+        try:
+
+            digest = hashlib.sha256(
+                Path(path).read_bytes()
+            ).hexdigest()
+
+        except FileNotFoundError:
+
+            digest = None
+
+        if (
+            digest == self.get_meta(
+                "snapshot_sha256"
+            )
+            and
+            not journal_path(
+                path
+            ).exists()
+        ):
+
+            return 0
+
+        data = PlateStore.load(
+            path
+        ).to_dict()
+
+        self.pending = {}
+
+        # Én transaktion med digest: et afbrudt import
+        # efterlader den gamle tabel, og næste load
+        # prøver igen.
+        with self.connection:
+
+            self.connection.execute(
+                "DELETE FROM plates"
+            )
+
+            imported = self.write(
+
+                (
+                    company,
+                    entry,
+                )
+
+                for company, entries in data.items()
+
+                for entry in entries
+            )
+
+            self.set_meta(
+                "snapshot_sha256",
+                digest,
+            )
+
+        return imported
+
+    def save(
+        self,
+        path,
+    ):
+        """
+        Skriver ventende plader, rydder op efter
+        PLATES_RETENTION_DAYS og eksporterer
+        plates.json.
+        """
+
+        self.flush()
+
+        if PLATES_RETENTION_DAYS > 0:
+
+            cutoff = (
+                datetime.now(
+                    COPENHAGEN
+                ).date()
+                -
+                timedelta(
+                    days=PLATES_RETENTION_DAYS
+                )
+            ).isoformat()
+
+            pruned = self.prune(
+                cutoff
+            )
+
+            if pruned:
+
+                print(
+                    f"🧹 {pruned} plader før {cutoff} "
+                    "slettet lokalt."
+                )
+
+        body = self.export_snapshot()
+
+        write_snapshot_body(
+            path,
+            body,
+        )
+
+        # Journalen er flettet ind ved load.
+        journal_path(
+            path
+        ).unlink(
+            missing_ok=True
+        )
+
+        with self.connection:
+
+            self.set_meta(
+                "snapshot_sha256",
+                hashlib.sha256(
+                    body
+                ).hexdigest(),
+            )
+
+        self.new = []
+
+
+# ============================================================
+# INDLÆS OG GEM
+# ============================================================
+
+def open_store(
+    path,
+):
+    """
+    Pladerne for plates.json på path i den valgte
+    PLATES_STORAGE.
+    """
+
+    if PLATES_STORAGE == "sqlite":
+
+        return SQLitePlateStore.load(
+            path
+        )
+
+    return PlateStore.load(
+        path
+    )
+
+
+def compact(
+    path,
+    data=None,
+):
+    """
+    Folder journalen ind i snapshot. Snapshot skrives
+    først; dør runnet før journalen er slettet, giver
+    den blot dubletter, som PlateStore.load ignorerer.
+    """
+
+    if data is None:
+
+        data = PlateStore.load(
+            path
+        ).to_dict()
+
+    write_snapshot(
+        path,
+        data,
+    )
+
+    journal_path(
+        path
+    ).unlink(
+        missing_ok=True
+    )
+
+    return data
+
+
+def save_plates(
+    path,
+    data,
+    new_records,
+):
+    """
+    Gemmer et runs plader. data er hele
+    company -> entries, new_records de rækker
+    ({"company", **entry}), der er kommet til.
+    """
+
+    if PLATES_STORAGE != "journal":
+
+        # Hele filen skrives; en evt. journal fra
+        # journal-mode er dermed foldet ind.
+        compact(
+            path,
+            data,
+        )
+
+        return
+
+    append_journal(
+        path,
+        new_records,
+    )
+
+    try:
+
+        size = journal_path(
+            path
+        ).stat().st_size
+
+    except FileNotFoundError:
+
+        return
+
+    if size > PLATES_JOURNAL_MAX_BYTES:
+
+        compact(
+            path,
+            data,
+        )
+
+        print(
+            "🗜️ Journal komprimeret ind i "
+            f"{Path(path).name} ({size / 1024:.0f} KB)."
+        )
+
+
+# ============================================================
+# START
+# ============================================================
+
+if __name__ == "__main__":
+
+    # python plate_store.py compact [sti til plates.json]
+    # python plate_store.py export [sti til plates.json]
+    if sys.argv[1:2] not in (
+        ["compact"],
+        ["export"],
+    ):
+
+        print(
+            "Brug: python plate_store.py "
+            "compact|export [plates.json]"
+        )
+
+        sys.exit(1)
+
+    target = Path(
+        sys.argv[2]
+        if len(sys.argv) > 2
+        else os.getenv(
+            "JSON_FILE_PATH",
+            Path(__file__).resolve().parent
+            / "public" / "plates" / "plates.json",
+        )
+    )
+
+    if sys.argv[1] == "export":
+
+        # Databasen eksporteres til plates.json.
+        store = SQLitePlateStore.load(
+            target
+        )
+
+        store.save(
+            target
+        )
+
+        print(
+            f"📤 {target}: {len(store)} plader "
+            f"fra {store.path}."
+        )
+
+        store.close()
+
+        sys.exit(0)
+
+    data = compact(
+        target
+    )
+
+    print(
+        f"🗜️ {target}: "
+        f"{sum(len(entries) for entries in data.values())} plader."
+    )
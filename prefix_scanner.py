@@ -0,0 +1,4090 @@
+import argparse
+import asyncio
+import aiohttp
+import heapq
+import itertools
+import os
+import html
+import re
+import random
+import signal
+import subprocess
+import sys
+import time
+
+from collections import deque
+from itertools import zip_longest
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+from bs4 import BeautifulSoup
+
+from rate_control import (
+    AdaptiveLimiter,
+    ScanAborted,
+    abort_when_set,
+    backoff_delay,
+    describe_buckets,
+    get_bucket,
+    share_rate_limits,
+)
+from json_codec import (
+    JSONDecodeError,
+    loads,
+    read_json,
+)
+from plate_mirror import (
+    describe_sync,
+    open_mirror,
+)
+from plate_store import (
+    open_store,
+)
+from supabase_client import (
+    SupabaseClient,
+    SupabaseError,
+)
+from scan_state import (
+    NegativeCache,
+    VehicleCache,
+    clear_checkpoint,
+    load_checkpoint,
+    load_frontier,
+    load_shard_results,
+    save_checkpoint,
+    save_frontier,
+    save_shard_result,
+    shard_state_dir,
+)
+
+
+# ============================================================
+# KONFIGURATION
+# ============================================================
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+JSON_FILE_PATH = Path(
+    os.getenv(
+        "JSON_FILE_PATH",
+        REPO_ROOT / "public" / "plates" / "plates.json",
+    )
+)
+
+JSON_FILE_PATH.parent.mkdir(
+    parents=True,
+    exist_ok=True,
+)
+
+# Fund samles og sendes som én upsert, når der er
+# så mange, eller når der er gået så længe.
+SUPABASE_FLUSH_ROWS = int(
+    os.getenv(
+        "SUPABASE_FLUSH_ROWS",
+        "100",
+    )
+)
+
+SUPABASE_FLUSH_SECONDS = float(
+    os.getenv(
+        "SUPABASE_FLUSH_SECONDS",
+        "2",
+    )
+)
+
+
+# ============================================================
+# BILOPSLAG COOKIES
+# ============================================================
+
+try:
+    BILOPSLAG_COOKIES = loads(
+        os.getenv(
+            "BILOPSLAG_COOKIES_JSON",
+            "",
+        ) or "{}"
+    )
+
+except JSONDecodeError:
+
+    print(
+        "⚠️ BILOPSLAG_COOKIES_JSON "
+        "er ikke gyldig JSON."
+    )
+
+    BILOPSLAG_COOKIES = {}
+
+
+# ============================================================
+# NUMMERPLADER
+# ============================================================
+
+# Serier der scannes, når intet gives på kommandolinjen.
+# Fx "EV,EW" eller "EV:10000-59999,EW".
+SCAN_PREFIXES = os.getenv(
+    "SCAN_PREFIXES",
+    "EV,EW",
+)
+
+# Standardinterval for serier uden eget interval.
+START_NUMBER = int(
+    os.getenv(
+        "START_NUMBER",
+        "10000",
+    )
+)
+
+END_NUMBER = int(
+    os.getenv(
+        "END_NUMBER",
+        "99999",
+    )
+)
+
+
+# ============================================================
+# FRONTIER
+# ============================================================
+
+# Nye plader udstedes nogenlunde i rækkefølge.
+# Kendes det højeste nummer med en frisk dato
+# (frontieren), scannes kun et vindue omkring den
+# plus en lille stikprøve af resten af intervallet.
+FULL_SCAN = (
+    os.getenv(
+        "FULL_SCAN",
+        "0",
+    )
+    == "1"
+)
+
+FRONTIER_BEHIND = int(
+    os.getenv(
+        "FRONTIER_BEHIND",
+        "2000",
+    )
+)
+
+FRONTIER_AHEAD = int(
+    os.getenv(
+        "FRONTIER_AHEAD",
+        "3000",
+    )
+)
+
+FRONTIER_SAMPLE_SIZE = int(
+    os.getenv(
+        "FRONTIER_SAMPLE_SIZE",
+        "500",
+    )
+)
+
+# En plade tæller med i frontieren, hvis første
+# registrering eller forsikring er så mange dage gammel.
+FRONTIER_RECENT_DAYS = int(
+    os.getenv(
+        "FRONTIER_RECENT_DAYS",
+        "14",
+    )
+)
+
+
+# ============================================================
+# CACHES
+# ============================================================
+
+# Kendte plader går direkte til DMR-opslaget med
+# det gemte vehicle ID i stedet for at hente siden.
+VEHICLE_CACHE = (
+    os.getenv(
+        "VEHICLE_CACHE",
+        "1",
+    )
+    == "1"
+)
+
+# Plader der gav HTTP 404 springes over, indtil TTL udløber.
+NEGATIVE_CACHE = (
+    os.getenv(
+        "NEGATIVE_CACHE",
+        "1",
+    )
+    == "1"
+)
+
+NEGATIVE_CACHE_TTL_HOURS = float(
+    os.getenv(
+        "NEGATIVE_CACHE_TTL_HOURS",
+        "24",
+    )
+)
+
+# Kortere TTL omkring frontieren, hvor nye plader
+# kan dukke op fra run til run.
+NEGATIVE_CACHE_NEAR_TTL_MINUTES = float(
+    os.getenv(
+        "NEGATIVE_CACHE_NEAR_TTL_MINUTES",
+        "10",
+    )
+)
+
+
+# ============================================================
+# BILOPSLAG
+# ============================================================
+
+BILOPSLAG_BASE_URL = (
+    "https://bilopslag.nu"
+)
+
+MAX_CONNECTIONS = int(
+    os.getenv(
+        "MAX_CONNECTIONS",
+        "8",
+    )
+)
+
+# Vinduet (antal seneste plader) som HTTP 403
+# tælles over, før et run stoppes.
+SCAN_BATCH_SIZE = int(
+    os.getenv(
+        "SCAN_BATCH_SIZE",
+        "250",
+    )
+)
+
+BLOCKED_ABORT_THRESHOLD = int(
+    os.getenv(
+        "BLOCKED_ABORT_THRESHOLD",
+        "20",
+    )
+)
+
+# Pipelinen har to trin med hver sin grænse:
+# sideopslag (/nummerplade) og DMR-opslag (/api/.../dmr).
+PAGE_CONNECTIONS = int(
+    os.getenv(
+        "PAGE_CONNECTIONS",
+        str(MAX_CONNECTIONS),
+    )
+)
+
+DMR_CONNECTIONS = int(
+    os.getenv(
+        "DMR_CONNECTIONS",
+        str(MAX_CONNECTIONS),
+    )
+)
+
+# Grænserne ovenfor er startværdier. Med
+# ADAPTIVE_CONCURRENCY justeres de løbende (AIMD)
+# op til disse lofter.
+PAGE_CONNECTIONS_MAX = int(
+    os.getenv(
+        "PAGE_CONNECTIONS_MAX",
+        str(PAGE_CONNECTIONS * 4),
+    )
+)
+
+DMR_CONNECTIONS_MAX = int(
+    os.getenv(
+        "DMR_CONNECTIONS_MAX",
+        str(DMR_CONNECTIONS * 4),
+    )
+)
+
+# Workers i sidetrinnet. Flere end loftet for
+# sideopslag, så parsing ikke holder forbindelser tomme.
+SCAN_WORKERS = int(
+    os.getenv(
+        "SCAN_WORKERS",
+        str(PAGE_CONNECTIONS_MAX * 2),
+    )
+)
+
+SCAN_QUEUE_SIZE = int(
+    os.getenv(
+        "SCAN_QUEUE_SIZE",
+        str(SCAN_WORKERS * 4),
+    )
+)
+
+# En fuld DMR-kø får sidetrinnet til at vente.
+DMR_QUEUE_SIZE = int(
+    os.getenv(
+        "DMR_QUEUE_SIZE",
+        str(DMR_CONNECTIONS_MAX * 2),
+    )
+)
+
+PROGRESS_EVERY = int(
+    os.getenv(
+        "PROGRESS_EVERY",
+        "1000",
+    )
+)
+
+# Antal nye forsøg pr. plade efter 429, timeout,
+# netværks- eller serverfejl. Forsøgene lægges bagest
+# i pipelinen med backoff (RETRY_BASE_SECONDS m.fl.).
+PLATE_RETRY_BUDGET = int(
+    os.getenv(
+        "PLATE_RETRY_BUDGET",
+        "3",
+    )
+)
+
+# Position, afventende plader og fund gemmes så ofte,
+# så et afbrudt run kan fortsætte næste gang.
+CHECKPOINT_SECONDS = float(
+    os.getenv(
+        "CHECKPOINT_SECONDS",
+        "60",
+    )
+)
+
+# Ældre checkpoints ignoreres, og scanningen
+# starter forfra.
+CHECKPOINT_MAX_AGE_HOURS = float(
+    os.getenv(
+        "CHECKPOINT_MAX_AGE_HOURS",
+        "12",
+    )
+)
+
+# DMR-svar (status fra get_insurance_info) der
+# er værd at prøve igen.
+RETRYABLE_DMR_STATUSES = {
+    "429",
+    "500",
+    "502",
+    "503",
+    "504",
+    "Fejl",
+}
+
+REQUEST_TIMEOUT = int(
+    os.getenv(
+        "REQUEST_TIMEOUT",
+        "25",
+    )
+)
+
+# Læs pladesiden i bidder og stop, så snart
+# data-vehicle er fanget. "0" læser hele siden.
+STREAM_PAGE_READS = (
+    os.getenv(
+        "STREAM_PAGE_READS",
+        "1",
+    )
+    == "1"
+)
+
+# Er data-vehicle ikke begyndt inden for så mange
+# bytes, regnes siden for at være uden køretøj.
+PAGE_SCAN_LIMIT_BYTES = int(
+    os.getenv(
+        "PAGE_SCAN_LIMIT_BYTES",
+        "524288",
+    )
+)
+
+PAGE_CHUNK_SIZE = 16384
+
+# Processer til HTML-parsing uden for event loopet.
+# "0" parser i event loopet, "auto" bruger alle kerner.
+PARSE_WORKERS = os.getenv(
+    "PARSE_WORKERS",
+    "0",
+).strip().lower()
+
+PARSE_WORKERS = (
+    os.cpu_count() or 1
+    if PARSE_WORKERS == "auto"
+    else int(PARSE_WORKERS)
+)
+
+COPENHAGEN = ZoneInfo(
+    "Europe/Copenhagen"
+)
+
+
+# ============================================================
+# HEADERS
+# ============================================================
+
+BILOPSLAG_HEADERS = {
+
+    "accept": (
+        "text/html,"
+        "application/xhtml+xml,"
+        "application/xml;q=0.9,"
+        "image/avif,"
+        "image/webp,"
+        "image/apng,"
+        "*/*;q=0.8"
+    ),
+
+    "accept-language": (
+        "da-DK,da;q=0.9,"
+        "en-US;q=0.8,"
+        "en;q=0.7"
+    ),
+
+    "cache-control": "no-cache",
+
+    "pragma": "no-cache",
+
+    "referer": (
+        "https://bilopslag.nu/"
+    ),
+
+    "upgrade-insecure-requests": "1",
+
+    "user-agent": (
+        "Mozilla/5.0 "
+        "(Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 "
+        "(KHTML, like Gecko) "
+        "Chrome/151.0.0.0 "
+        "Safari/537.36"
+    ),
+}
+
+
+# ============================================================
+# HJÆLPEFUNKTIONER
+# ============================================================
+
+def parse_date(value):
+
+    if not value:
+        return None
+
+    value = str(value).strip()
+
+    formats = (
+        "%Y-%m-%d",
+        "%d-%m-%Y",
+        "%d.%m.%Y",
+    )
+
+    for date_format in formats:
+
+        try:
+
+            return datetime.strptime(
+                value,
+                date_format,
+            ).date()
+
+        except ValueError:
+
+            continue
+
+    return None
+
+
+def clean_company(value):
+
+    if not value:
+        return "Ukendt"
+
+    return " ".join(
+        str(value).split()
+    ).strip()
+
+
+# ============================================================
+# LOKAL JSON
+# ============================================================
+
+def load_existing_data():
+
+    return open_store(
+        JSON_FILE_PATH
+    )
+
+
+def save_to_json(
+    plates,
+):
+
+    plates.save(
+        JSON_FILE_PATH
+    )
+
+
+# ============================================================
+# SUPABASE
+# ============================================================
+
+def supabase_configured(
+    supabase,
+):
+
+    if supabase.configured:
+
+        return True
+
+    print(
+        "⚠️ Mangler Supabase "
+        "credentials."
+    )
+
+    return False
+
+
+# ============================================================
+# SLET GAMLE PLADER
+# ============================================================
+
+async def delete_old_plates_from_supabase(
+    supabase,
+    mirror=None,
+):
+
+    if not supabase_configured(
+        supabase
+    ):
+
+        return False
+
+    cutoff_date = (
+        datetime.now(
+            COPENHAGEN
+        ).date()
+        -
+        timedelta(
+            days=2
+        )
+    ).isoformat()
+
+    try:
+
+        await supabase.delete(
+            "plates",
+            {
+                "date": f"lt.{cutoff_date}",
+            },
+        )
+
+    except SupabaseError as error:
+
+        print(
+            "❌ Oprydning fejlede: "
+            f"{error}"
+        )
+
+        return False
+
+    # Spejlet ryddes op på samme måde, så antallet
+    # stadig stemmer med Supabase.
+    if mirror is not None:
+
+        mirror.delete_before(
+            cutoff_date
+        )
+
+    print(
+        "🧹 Plader før "
+        f"{cutoff_date} "
+        "er slettet."
+    )
+
+    return True
+
+
+async def sync_plate_mirror(
+    mirror,
+    supabase,
+):
+    """
+    Synker det lokale spejl af Supabase-tabellen.
+    Returnerer True, hvis det er à jour.
+    """
+
+    try:
+
+        result = await mirror.sync(
+            supabase
+        )
+
+    except SupabaseError as error:
+
+        print(
+            "⚠️ Spejlet kunne ikke synces: "
+            f"{error}"
+        )
+
+        return False
+
+    print(
+        f"🪞 Spejl: {describe_sync(result)}"
+    )
+
+    return True
+
+
+async def prepare_plate_mirror():
+    """
+    Synker spejlet én gang, før shards starter;
+    de læser det uden selv at kontakte Supabase.
+    """
+
+    mirror = open_mirror()
+
+    if mirror is None:
+
+        return
+
+    try:
+
+        async with SupabaseClient() as supabase:
+
+            if supabase_configured(
+                supabase
+            ):
+
+                await sync_plate_mirror(
+                    mirror,
+                    supabase,
+                )
+
+    finally:
+
+        mirror.close()
+
+
+# ============================================================
+# UPSERT I BAGGRUNDEN
+# ============================================================
+
+def plate_payload(
+    company,
+    entry,
+):
+
+    return {
+
+        "company":
+            company,
+
+        "plate":
+            entry["plate"],
+
+        "date":
+            entry["date"],
+
+        "checked":
+            entry.get(
+                "checked",
+                False,
+            ),
+
+        "premium":
+            entry.get(
+                "premium",
+                0,
+            ),
+
+        "note":
+            entry.get(
+                "note",
+                "",
+            ),
+    }
+
+
+class SupabaseUpserter:
+    """
+    Samler fund og sender dem som multi-row upserts
+    fra en baggrunds-task, så event loopet aldrig
+    venter på Supabase.
+
+    Bufferen sendes, når den når max_rows, når der
+    er gået max_seconds, og en sidste gang ved luk.
+    Rækker fra en fejlet flush prøves igen ved næste.
+    """
+
+    def __init__(
+        self,
+        supabase,
+        max_rows=None,
+        max_seconds=None,
+    ):
+
+        self.supabase = supabase
+
+        self.max_rows = (
+            max_rows
+            or SUPABASE_FLUSH_ROWS
+        )
+
+        self.max_seconds = (
+            max_seconds
+            or SUPABASE_FLUSH_SECONDS
+        )
+
+        self.buffer = []
+
+        self.wake = asyncio.Event()
+
+        self.task = None
+
+        self.closing = False
+
+        self.stats = {
+            "requests": 0,
+            "rows": 0,
+            "failed": 0,
+            "latency": 0.0,
+            "max_latency": 0.0,
+        }
+
+    def start(self):
+
+        self.task = asyncio.create_task(
+            self.run()
+        )
+
+    def add(
+        self,
+        company,
+        entry,
+    ):
+
+        self.buffer.append(
+            plate_payload(
+                company,
+                entry,
+            )
+        )
+
+        if len(
+            self.buffer
+        ) >= self.max_rows:
+
+            self.wake.set()
+
+    async def run(self):
+
+        while not self.closing:
+
+            try:
+
+                await asyncio.wait_for(
+                    self.wake.wait(),
+                    self.max_seconds,
+                )
+
+            except asyncio.TimeoutError:
+
+                pass
+
+            self.wake.clear()
+
+            await self.flush()
+
+    async def flush(self):
+
+        while self.buffer:
+
+            batch = self.buffer[
+                :self.max_rows
+            ]
+
+            del self.buffer[
+                :self.max_rows
+            ]
+
+            if not await self.post(
+                batch
+            ):
+
+                # Tilbage forrest i køen til næste flush.
+                self.buffer[:0] = batch
+
+                return False
+
+        return True
+
+    async def post(
+        self,
+        batch,
+    ):
+
+        started = time.perf_counter()
+
+        try:
+
+            await self.supabase.upsert(
+                "plates",
+                batch,
+                on_conflict="company,plate",
+                chunk_size=len(batch),
+            )
+
+            error = None
+
+        except SupabaseError as failure:
+
+            error = failure
+
+        latency = (
+            time.perf_counter()
+            - started
+        )
+
+        self.stats["requests"] += 1
+
+        self.stats["latency"] += latency
+
+        self.stats["max_latency"] = max(
+            self.stats["max_latency"],
+            latency,
+        )
+
+        if not error:
+
+            self.stats["rows"] += len(
+                batch
+            )
+
+            return True
+
+        self.stats["failed"] += len(
+            batch
+        )
+
+        print(
+            "❌ Supabase upsert fejlede "
+            f"({len(batch)} plader): {error}"
+        )
+
+        return False
+
+    async def close(self):
+
+        # Tasken afsluttes efter sin næste flush i
+        # stedet for at blive annulleret midt i en POST.
+        self.closing = True
+
+        self.wake.set()
+
+        if self.task:
+
+            await self.task
+
+            self.task = None
+
+        if not await self.flush():
+
+            print(
+                "❌ Supabase: "
+                f"{len(self.buffer)} plader blev ikke sendt."
+            )
+
+    def describe(self):
+
+        requests_made = max(
+            self.stats["requests"],
+            1,
+        )
+
+        return (
+            f"{self.stats['rows']} plader i "
+            f"{self.stats['requests']} requests "
+            f"({self.stats['rows'] / requests_made:.1f} pr. request) | "
+            "flush-latens gns. "
+            f"{self.stats['latency'] / requests_made * 1000:.0f} ms, "
+            f"max {self.stats['max_latency'] * 1000:.0f} ms | "
+            f"fejlede rækker {self.stats['failed']}"
+        )
+
+
+# ============================================================
+# UPLOAD MANGE PLADER
+# ============================================================
+
+async def upload_plates_to_supabase(
+    supabase,
+    found_entries,
+):
+    """
+    Sender fund ({"company", **entry}) i få
+    requests. Bruges af merge-trinnet efter shards.
+    """
+
+    if not supabase_configured(
+        supabase
+    ):
+
+        return 0
+
+    try:
+
+        return await supabase.upsert(
+            "plates",
+            [
+                plate_payload(
+                    found["company"],
+                    found,
+                )
+
+                for found in found_entries
+            ],
+            on_conflict="company,plate",
+        )
+
+    except SupabaseError as error:
+
+        print(
+            "❌ Supabase upload fejlede: "
+            f"{error}"
+        )
+
+        return 0
+
+
+# ============================================================
+# FIND VEHICLE-DATA I BILOPSLAG HTML
+# ============================================================
+
+VEHICLE_MARKER = b"data-vehicle"
+
+VEHICLE_ATTRIBUTE_REGEX = re.compile(
+    rb"\sdata-vehicle\s*=\s*([\"'])"
+)
+
+# Hvor ofte hver sti er brugt i dette run.
+# fast    = attributten er læst direkte fra bytes
+# soup    = fast path fejlede, BeautifulSoup tog over
+# missing = siden indeholder slet ikke data-vehicle
+EXTRACT_STATS = {
+    "fast": 0,
+    "soup": 0,
+    "missing": 0,
+}
+
+
+def vehicle_matches_plate(
+    vehicle,
+    expected_plate,
+):
+
+    registration = str(
+        vehicle.get(
+            "registration",
+            "",
+        )
+    ).upper().strip()
+
+    return (
+        registration
+        ==
+        expected_plate.upper()
+    )
+
+
+def extract_vehicle_data_from_html(
+    page_html,
+    expected_plate,
+):
+
+    soup = BeautifulSoup(
+        page_html,
+        "html.parser",
+    )
+
+    vehicle_element = soup.select_one(
+        "[data-vehicle]"
+    )
+
+    if not vehicle_element:
+
+        return None
+
+    raw_vehicle = vehicle_element.get(
+        "data-vehicle"
+    )
+
+    if not raw_vehicle:
+
+        return None
+
+    try:
+
+        # BeautifulSoup decoder normalt allerede HTML entities,
+        # men html.unescape gør funktionen robust.
+        raw_vehicle = html.unescape(
+            raw_vehicle
+        )
+
+        vehicle = loads(
+            raw_vehicle
+        )
+
+    except Exception as error:
+
+        print(
+            f"⚠️ Kunne ikke læse "
+            f"vehicle JSON for "
+            f"{expected_plate}: {error}"
+        )
+
+        return None
+
+    if not vehicle_matches_plate(
+        vehicle,
+        expected_plate,
+    ):
+
+        return None
+
+    return vehicle
+
+
+def decode_vehicle_attribute(
+    page_bytes,
+):
+    """
+    Læser data-vehicle direkte fra de rå bytes
+    uden at bygge et DOM.
+
+    Rejser ValueError når attributten ikke kan
+    læses sikkert, så kalderen kan falde tilbage
+    til BeautifulSoup.
+    """
+
+    match = VEHICLE_ATTRIBUTE_REGEX.search(
+        page_bytes
+    )
+
+    if not match:
+
+        raise ValueError(
+            "data-vehicle ikke fundet "
+            "som citeret attribut"
+        )
+
+    quote = match.group(1)
+
+    value_start = match.end()
+
+    value_end = page_bytes.find(
+        quote,
+        value_start,
+    )
+
+    if value_end == -1:
+
+        raise ValueError(
+            "data-vehicle er ikke afsluttet"
+        )
+
+    raw_vehicle = page_bytes[
+        value_start:value_end
+    ]
+
+    # Uden entities kan bytes gå direkte til loads.
+    if b"&" in raw_vehicle:
+
+        raw_vehicle = html.unescape(
+            raw_vehicle.decode("utf-8")
+        )
+
+    vehicle = loads(
+        raw_vehicle
+    )
+
+    if not isinstance(
+        vehicle,
+        dict,
+    ):
+
+        raise ValueError(
+            "data-vehicle er ikke et objekt"
+        )
+
+    return vehicle
+
+
+def extract_vehicle_data(
+    page_bytes,
+    expected_plate,
+):
+    """
+    Returnerer (vehicle, sti), hvor sti er en
+    af nøglerne i EXTRACT_STATS.
+    """
+
+    if VEHICLE_MARKER not in page_bytes:
+
+        return None, "missing"
+
+    try:
+
+        vehicle = decode_vehicle_attribute(
+            page_bytes
+        )
+
+    except ValueError:
+
+        vehicle = extract_vehicle_data_from_html(
+            page_bytes.decode(
+                "utf-8",
+                errors="ignore",
+            ),
+            expected_plate,
+        )
+
+        return vehicle, "soup"
+
+    if not vehicle_matches_plate(
+        vehicle,
+        expected_plate,
+    ):
+
+        return None, "fast"
+
+    return vehicle, "fast"
+
+
+# ============================================================
+# STREAMET LÆSNING AF PLADESIDEN
+# ============================================================
+
+# early = stoppet lige efter data-vehicle
+# limit = stoppet ved PAGE_SCAN_LIMIT_BYTES
+# full  = hele siden er læst
+PAGE_READ_STATS = {
+    "early": 0,
+    "limit": 0,
+    "full": 0,
+    "bytes": 0,
+}
+
+
+async def read_page_until_vehicle(
+    response,
+):
+    """
+    Læser body i bidder, indtil data-vehicle er
+    komplet eller grænsen viser, at den mangler.
+
+    Stoppes der før tid, lukkes forbindelsen i
+    stedet for at hente resten af siden.
+    """
+
+    buffer = bytearray()
+
+    search_from = 0
+
+    value_start = None
+
+    outcome = "full"
+
+    async for chunk in (
+        response.content.iter_chunked(
+            PAGE_CHUNK_SIZE
+        )
+    ):
+
+        buffer.extend(
+            chunk
+        )
+
+        if value_start is None:
+
+            match = VEHICLE_ATTRIBUTE_REGEX.search(
+                buffer,
+                search_from,
+            )
+
+            if match:
+
+                value_start = match.end()
+
+                quote = match.group(1)
+
+            else:
+
+                # Attributnavnet kan være delt
+                # mellem to bidder.
+                search_from = max(
+                    0,
+                    len(buffer) - 64,
+                )
+
+                if len(buffer) >= PAGE_SCAN_LIMIT_BYTES:
+
+                    outcome = "limit"
+
+                    break
+
+                continue
+
+        value_end = buffer.find(
+            quote,
+            value_start,
+        )
+
+        if value_end != -1:
+
+            del buffer[
+                value_end + 1:
+            ]
+
+            outcome = "early"
+
+            break
+
+    if outcome != "full":
+
+        response.close()
+
+    PAGE_READ_STATS[
+        outcome
+    ] += 1
+
+    PAGE_READ_STATS[
+        "bytes"
+    ] += len(buffer)
+
+    return bytes(buffer)
+
+
+# ============================================================
+# HENT BIL FRA BILOPSLAG
+# ============================================================
+
+# Sekunder brugt på netværk (med et slot i limiteren)
+# og på parsing (efter slottet er frigivet).
+TIMING_STATS = {
+    "network": 0.0,
+    "parse": 0.0,
+}
+
+
+async def get_vehicle(
+    session,
+    regnr,
+    limiter,
+    parse_executor=None,
+):
+
+    url = (
+        f"{BILOPSLAG_BASE_URL}"
+        f"/nummerplade/"
+        f"{regnr.upper()}"
+    )
+
+    bucket = get_bucket(
+        url
+    )
+
+    await bucket.acquire()
+
+    async with limiter.slot() as slot:
+
+        network_started = time.perf_counter()
+
+        try:
+
+            async with session.get(
+                url,
+                timeout=aiohttp.ClientTimeout(
+                    total=REQUEST_TIMEOUT
+                ),
+                allow_redirects=True,
+            ) as response:
+
+                slot.observe_status(
+                    response.status
+                )
+
+                bucket.observe_response(
+                    response.status,
+                    response.headers,
+                )
+
+                # Pladen findes ikke
+                if response.status == 404:
+
+                    return {
+                        "missing": True,
+                        "registration": regnr,
+                    }
+
+                if response.status == 403:
+
+                    print(
+                        f"⛔ {regnr}: "
+                        "Bilopslag gav HTTP 403."
+                    )
+
+                    return {
+                        "blocked": True,
+                        "registration": regnr,
+                    }
+
+                if response.status == 429:
+
+                    print(
+                        f"⚠️ {regnr}: "
+                        "Bilopslag rate-limit "
+                        "(HTTP 429)."
+                    )
+
+                    return {
+                        "retry": True,
+                        "registration": regnr,
+                    }
+
+                if response.status >= 500:
+
+                    return {
+                        "retry": True,
+                        "registration": regnr,
+                    }
+
+                if response.status != 200:
+
+                    return None
+
+                if STREAM_PAGE_READS:
+
+                    page_bytes = (
+                        await read_page_until_vehicle(
+                            response
+                        )
+                    )
+
+                else:
+
+                    page_bytes = (
+                        await response.read()
+                    )
+
+                    PAGE_READ_STATS[
+                        "full"
+                    ] += 1
+
+                    PAGE_READ_STATS[
+                        "bytes"
+                    ] += len(page_bytes)
+
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as error:
+
+            slot.observe_error(
+                error
+            )
+
+            print(
+                f"⚠️ {regnr}: "
+                f"{error or type(error).__name__}"
+            )
+
+            return {
+                "retry": True,
+                "registration": regnr,
+            }
+
+        finally:
+
+            TIMING_STATS[
+                "network"
+            ] += (
+                time.perf_counter()
+                -
+                network_started
+            )
+
+
+    # ========================================================
+    # PARSING - NETVÆRKSSLOTTET ER FRIGIVET
+    # ========================================================
+
+    parse_started = time.perf_counter()
+
+    if parse_executor:
+
+        vehicle, method = (
+            await asyncio.get_running_loop().run_in_executor(
+                parse_executor,
+                extract_vehicle_data,
+                page_bytes,
+                regnr,
+            )
+        )
+
+    else:
+
+        vehicle, method = (
+            extract_vehicle_data(
+                page_bytes,
+                regnr,
+            )
+        )
+
+    TIMING_STATS[
+        "parse"
+    ] += (
+        time.perf_counter()
+        -
+        parse_started
+    )
+
+    EXTRACT_STATS[
+        method
+    ] += 1
+
+    return vehicle
+
+
+# ============================================================
+# HENT DMR/FORSIKRING FRA BILOPSLAG
+# ============================================================
+
+async def get_insurance_info(
+    session,
+    vehicle_id,
+    limiter,
+):
+
+    url = (
+        f"{BILOPSLAG_BASE_URL}"
+        f"/api/statistics/vehicles/"
+        f"{vehicle_id}/dmr"
+    )
+
+    bucket = get_bucket(
+        url
+    )
+
+    await bucket.acquire()
+
+    async with limiter.slot() as slot:
+
+        try:
+
+            async with session.get(
+                url,
+                timeout=aiohttp.ClientTimeout(
+                    total=REQUEST_TIMEOUT
+                ),
+                headers={
+                    "Accept": "application/json",
+                    "X-Requested-With":
+                        "XMLHttpRequest",
+                },
+            ) as response:
+
+                slot.observe_status(
+                    response.status
+                )
+
+                bucket.observe_response(
+                    response.status,
+                    response.headers,
+                )
+
+                if response.status == 403:
+
+                    return (
+                        "Ukendt",
+                        None,
+                        "403",
+                    )
+
+                if response.status == 429:
+
+                    return (
+                        "Ukendt",
+                        None,
+                        "429",
+                    )
+
+                if response.status != 200:
+
+                    return (
+                        "Ukendt",
+                        None,
+                        str(
+                            response.status
+                        ),
+                    )
+
+                data = await read_json(
+                    response
+                )
+
+                dmr_data = (
+                    data.get(
+                        "dmr_data",
+                        {},
+                    )
+                    or {}
+                )
+
+                company = clean_company(
+                    dmr_data.get(
+                        "insurance_company"
+                    )
+                )
+
+                status = str(
+                    dmr_data.get(
+                        "insurance_status",
+                        "",
+                    )
+                ).strip()
+
+                created_at = parse_date(
+                    dmr_data.get(
+                        "insurance_created_at"
+                    )
+                )
+
+                return (
+                    company,
+                    created_at,
+                    status,
+                )
+
+        except Exception as error:
+
+            slot.observe_error(
+                error
+            )
+
+            print(
+                "⚠️ Forsikringsopslag "
+                f"fejlede for vehicle "
+                f"{vehicle_id}: {error}"
+            )
+
+            return (
+                "Ukendt",
+                None,
+                "Fejl",
+            )
+
+
+# ============================================================
+# PROCESS ÉN NUMMERPLADE
+# ============================================================
+
+async def lookup_vehicle(
+    session,
+    regnr,
+    limiter,
+    parse_executor=None,
+    negative_cache=None,
+    vehicle_cache=None,
+):
+    """
+    Henter pladesiden og returnerer
+    (vehicle_id, første registrering),
+    "blocked", "missing", "retry" eller None.
+    """
+
+    vehicle = await get_vehicle(
+        session,
+        regnr,
+        limiter,
+        parse_executor,
+    )
+
+    if not vehicle:
+
+        return None
+
+    if vehicle.get(
+        "blocked"
+    ):
+
+        return "blocked"
+
+    if vehicle.get(
+        "retry"
+    ):
+
+        return "retry"
+
+    if vehicle.get(
+        "missing"
+    ):
+
+        if negative_cache:
+
+            negative_cache.record(
+                regnr
+            )
+
+        return "missing"
+
+    if negative_cache:
+
+        negative_cache.forget(
+            regnr
+        )
+
+    vehicle_id = vehicle.get(
+        "id"
+    )
+
+    if not vehicle_id:
+
+        print(
+            f"⚠️ {regnr}: "
+            "intet vehicle ID."
+        )
+
+        return None
+
+    registration_date = parse_date(
+        vehicle.get(
+            "first_registration_date"
+        )
+    )
+
+    if vehicle_cache:
+
+        vehicle_cache.put(
+            regnr,
+            vehicle_id,
+            (
+                registration_date.isoformat()
+                if registration_date
+                else None
+            ),
+        )
+
+    return (
+        vehicle_id,
+        registration_date,
+    )
+
+
+def store_plate(
+    regnr,
+    registration_date,
+    insurance,
+    plates,
+    processed_plates,
+    frontier_seen=None,
+    upserter=None,
+):
+    """
+    Gemmer pladen lokalt og lægger den i upserterens
+    buffer. Uden upserter (shards) venter Supabase
+    til merge-trinnet.
+    """
+
+    (
+        company,
+        insurance_date,
+        insurance_status,
+    ) = insurance
+
+
+    if frontier_seen is not None:
+
+        record_frontier(
+            frontier_seen,
+            regnr,
+            registration_date,
+            insurance_date,
+        )
+
+
+    if (
+        not company
+        or
+        company == "Ukendt"
+    ):
+
+        print(
+            f"⚠️ {regnr}: "
+            "intet forsikringsselskab."
+        )
+
+        return
+
+
+    # ========================================================
+    # KUN AKTIV FORSIKRING
+    # ========================================================
+
+    if (
+        insurance_status
+        and
+        insurance_status.lower()
+        != "aktiv"
+    ):
+
+        print(
+            f"ℹ️ {regnr}: "
+            "forsikring er ikke aktiv "
+            f"({insurance_status})."
+        )
+
+        return
+
+
+    # ========================================================
+    # DATO
+    # ========================================================
+
+    today = datetime.now(
+        COPENHAGEN
+    ).date()
+
+    yesterday = (
+        today
+        -
+        timedelta(
+            days=1
+        )
+    )
+
+    valid_dates = {
+        today,
+        yesterday,
+    }
+
+
+    # Forsikringsdato foretrækkes.
+    if (
+        insurance_date
+        in valid_dates
+    ):
+
+        entry_date = (
+            insurance_date
+        )
+
+    elif (
+        registration_date
+        in valid_dates
+    ):
+
+        entry_date = (
+            registration_date
+        )
+
+    else:
+
+        return
+
+
+    # ========================================================
+    # ENTRY
+    # ========================================================
+
+    entry = {
+
+        "date":
+            entry_date.isoformat(),
+
+        "plate":
+            regnr,
+
+        "checked":
+            False,
+
+        "premium":
+            0,
+
+        "note":
+            "",
+    }
+
+
+    # ========================================================
+    # LOKAL JSON
+    # ========================================================
+
+    plates.add(
+        company,
+        entry,
+    )
+
+
+    # ========================================================
+    # SUPABASE
+    # ========================================================
+
+    if upserter:
+
+        upserter.add(
+            company,
+            entry,
+        )
+
+    processed_plates.add(
+        regnr
+    )
+
+    print(
+        "✅ "
+        f"{regnr} | "
+        f"{company} | "
+        f"{entry_date} | "
+        f"{insurance_status}"
+    )
+
+    return {
+        "company": company,
+        **entry,
+    }
+
+
+# ============================================================
+# SERIER OG INTERVALLER
+# ============================================================
+
+def parse_prefix_spec(spec):
+    """
+    "EV" eller "EV:10000-59999" -> dict med
+    prefix, start og end.
+    """
+
+    prefix, _, number_range = (
+        spec.strip().partition(":")
+    )
+
+    start_number = START_NUMBER
+    end_number = END_NUMBER
+
+    if number_range:
+
+        start_text, _, end_text = (
+            number_range.partition("-")
+        )
+
+        start_number = int(
+            start_text
+        )
+
+        end_number = int(
+            end_text
+            or start_text
+        )
+
+    return {
+
+        "prefix":
+            prefix.upper(),
+
+        "start":
+            start_number,
+
+        "end":
+            end_number,
+    }
+
+
+def parse_prefix_specs(specs):
+
+    if isinstance(
+        specs,
+        str,
+    ):
+
+        specs = specs.split(",")
+
+    return [
+
+        parse_prefix_spec(
+            spec
+        )
+
+        for spec in specs
+        if spec.strip()
+    ]
+
+
+def describe_prefix_ranges(
+    prefix_ranges,
+):
+
+    return ", ".join(
+
+        f"{item['prefix']}{item['start']:05d}"
+        "–"
+        f"{item['prefix']}{item['end']:05d}"
+
+        for item in prefix_ranges
+    )
+
+
+def plan_prefix_ranges(
+    prefix_ranges,
+    frontier,
+):
+    """
+    Sætter window og sample på hver serie.
+
+    Uden kendt frontier (eller med FULL_SCAN)
+    scannes hele intervallet.
+    """
+
+    for item in prefix_ranges:
+
+        item["window"] = None
+        item["sample"] = []
+        item["near"] = None
+
+        number = frontier.get(
+            item["prefix"]
+        )
+
+        if number is not None:
+
+            item["near"] = (
+                number - FRONTIER_BEHIND,
+                number + FRONTIER_AHEAD,
+            )
+
+        if (
+            FULL_SCAN
+            or
+            number is None
+        ):
+
+            continue
+
+        window_start = max(
+            item["start"],
+            number - FRONTIER_BEHIND,
+        )
+
+        window_end = min(
+            item["end"],
+            number + FRONTIER_AHEAD,
+        )
+
+        if window_start > window_end:
+
+            continue
+
+        item["window"] = (
+            window_start,
+            window_end,
+        )
+
+        # Stikprøven trækkes fra numrene uden for
+        # vinduet, som sikkerhedsnet hvis
+        # udstedelsen er sprunget.
+        below = (
+            window_start
+            -
+            item["start"]
+        )
+
+        above = (
+            item["end"]
+            -
+            window_end
+        )
+
+        # Seedet med serie, frontier og dato, så alle
+        # shards (og resume samme dag) trækker samme
+        # stikprøve og tilsammen dækker den præcis.
+        sampler = random.Random(
+            f"{item['prefix']}:{item['start']}:{item['end']}:"
+            f"{number}:{datetime.now(COPENHAGEN).date()}"
+        )
+
+        picks = sampler.sample(
+            range(
+                below
+                +
+                above
+            ),
+            min(
+                FRONTIER_SAMPLE_SIZE,
+                below + above,
+            ),
+        )
+
+        item["sample"] = sorted(
+
+            item["start"] + index
+            if index < below
+            else window_end + 1 + index - below
+
+            for index in picks
+        )
+
+    return prefix_ranges
+
+
+def plate_numbers(
+    item,
+):
+
+    if not item.get(
+        "window"
+    ):
+
+        numbers = range(
+            item["start"],
+            item["end"] + 1,
+        )
+
+    else:
+
+        window_start, window_end = (
+            item["window"]
+        )
+
+        numbers = [
+            *range(
+                window_start,
+                window_end + 1,
+            ),
+            *item["sample"],
+        ]
+
+    if not item.get(
+        "shard"
+    ):
+
+        return numbers
+
+    # Shard i/N tager hvert N'te nummer. Nye plader
+    # ligger tæt, så alle shards får en lige stor
+    # del af frontieren.
+    index, count = item["shard"]
+
+    return [
+
+        number
+
+        for number in numbers
+
+        if number % count == index - 1
+    ]
+
+
+def count_plates(
+    item,
+):
+
+    return len(
+        plate_numbers(
+            item
+        )
+    )
+
+
+def describe_plan(
+    item,
+):
+
+    shard = (
+        " | shard {}/{}".format(
+            *item["shard"]
+        )
+        if item.get("shard")
+        else ""
+    )
+
+    if not item.get(
+        "window"
+    ):
+
+        return (
+            f"{item['prefix']}: hele intervallet "
+            f"({count_plates(item)} plader{shard})"
+        )
+
+    window_start, window_end = (
+        item["window"]
+    )
+
+    return (
+        f"{item['prefix']}: vindue "
+        f"{window_start:05d}–{window_end:05d} "
+        f"+ {len(item['sample'])} stikprøver "
+        f"({count_plates(item)} plader{shard})"
+    )
+
+
+def negative_cache_ttl(
+    item,
+    number,
+):
+    """
+    Kort TTL tæt på frontieren, lang TTL ellers.
+    Uden kendt frontier regnes alt for tæt på.
+    """
+
+    near = item.get(
+        "near"
+    )
+
+    if (
+        near is None
+        or
+        near[0] <= number <= near[1]
+    ):
+
+        return (
+            NEGATIVE_CACHE_NEAR_TTL_MINUTES
+            * 60
+        )
+
+    return (
+        NEGATIVE_CACHE_TTL_HOURS
+        * 3600
+    )
+
+
+def record_frontier(
+    frontier_seen,
+    regnr,
+    *dates,
+):
+
+    cutoff = (
+        datetime.now(
+            COPENHAGEN
+        ).date()
+        -
+        timedelta(
+            days=FRONTIER_RECENT_DAYS
+        )
+    )
+
+    if not any(
+
+        value
+        and
+        value >= cutoff
+
+        for value in dates
+    ):
+
+        return
+
+    prefix = regnr[:-5]
+
+    number = int(
+        regnr[-5:]
+    )
+
+    frontier_seen[
+        prefix
+    ] = max(
+        frontier_seen.get(
+            prefix,
+            0,
+        ),
+        number,
+    )
+
+
+def plates_in_range(
+    item,
+):
+
+    for number in plate_numbers(
+        item
+    ):
+
+        yield f"{item['prefix']}{number:05d}"
+
+
+def interleave_plates(
+    prefix_ranges,
+):
+    """
+    Skiftes mellem serierne, så alle serier
+    deler pipelinen ligeligt fra start.
+    """
+
+    series = [
+
+        plates_in_range(
+            item
+        )
+
+        for item in prefix_ranges
+    ]
+
+    for plates in zip_longest(
+        *series
+    ):
+
+        for regnr in plates:
+
+            if regnr:
+
+                yield regnr
+
+
+# ============================================================
+# SCAN PIPELINE
+# ============================================================
+
+def new_stage(
+    name,
+    limit,
+    maximum,
+    queue_size,
+):
+
+    return {
+
+        "name":
+            name,
+
+        "queue":
+            asyncio.Queue(
+                maxsize=queue_size
+            ),
+
+        "limiter":
+            AdaptiveLimiter(
+                name,
+                limit,
+                maximum,
+            ),
+
+        "processed":
+            0,
+
+        "busy":
+            0.0,
+
+        "max_queue":
+            0,
+    }
+
+
+def describe_stage(
+    stage,
+    workers,
+    elapsed,
+):
+
+    utilization = (
+        stage["busy"]
+        /
+        max(
+            elapsed * workers,
+            0.001,
+        )
+    )
+
+    return (
+        f"{stage['name']}: "
+        f"{stage['processed']} "
+        f"({stage['processed'] / max(elapsed, 0.001):.1f}/s) | "
+        f"grænse {stage['limiter'].current()} | "
+        f"kø {stage['queue'].qsize()}/{stage['queue'].maxsize} "
+        f"(max {stage['max_queue']}) | "
+        f"travl {utilization:.0%}"
+    )
+
+
+async def scan_range(
+    session,
+    plates,
+    processed_plates,
+    prefix_ranges,
+    parse_executor=None,
+    frontier_seen=None,
+    negative_cache=None,
+    vehicle_cache=None,
+    found_entries=None,
+    resume=None,
+    stop=None,
+    upserter=None,
+    state_dir=None,
+    known=None,
+):
+    """
+    Pipeline over alle serier i to trin:
+
+    producer -> [sidekø] -> sideopslag
+             -> [DMR-kø] -> DMR-opslag -> gem
+
+    Hvert trin har sin egen grænse og kø. Er
+    DMR-køen fuld, venter sidetrinnet, og den
+    fulde sidekø bremser producenten.
+
+    Stoppes pipelinen før tid (403, SIGTERM), gemmes
+    et checkpoint, som resume kan fortsætte fra.
+
+    known (plade -> date fra spejlet af Supabase)
+    springes over; de er fundet før.
+    """
+
+    page = new_stage(
+        "sider",
+        PAGE_CONNECTIONS,
+        PAGE_CONNECTIONS_MAX,
+        SCAN_QUEUE_SIZE,
+    )
+
+    dmr = new_stage(
+        "dmr",
+        DMR_CONNECTIONS,
+        DMR_CONNECTIONS_MAX,
+        DMR_QUEUE_SIZE,
+    )
+
+    stop = stop or asyncio.Event()
+
+    if found_entries is None:
+
+        found_entries = []
+
+    resume = resume or {}
+
+    # Plader der er sendt ind i pipelinen og
+    # endnu ikke er færdige.
+    active = set()
+
+    # Vækker producenten, når en plade er færdig
+    # eller er lagt tilbage i køen.
+    wake = asyncio.Event()
+
+    # Plader der skal gennem sidetrinnet igen.
+    requeue = deque()
+
+    # Nye forsøg: (tidspunkt, løbenummer, plade).
+    retries = []
+
+    retry_order = itertools.count()
+
+    attempts = dict(
+        resume.get(
+            "attempts",
+            {},
+        )
+    )
+
+    requeue.extend(
+        resume.get(
+            "pending",
+            [],
+        )
+    )
+
+    total = sum(
+
+        count_plates(
+            item
+        )
+
+        for item in prefix_ranges
+    )
+
+    recent_blocked = deque(
+        maxlen=SCAN_BATCH_SIZE
+    )
+
+    stats = {
+        "done": 0,
+        "skipped": 0,
+        "known": 0,
+        "position": resume.get(
+            "position",
+            0,
+        ),
+        "blocked_in_window": 0,
+        "retries": 0,
+        "recovered": 0,
+        "gave_up": 0,
+    }
+
+    items_by_prefix = {
+
+        item["prefix"]:
+            item
+
+        for item in prefix_ranges
+    }
+
+    started = time.perf_counter()
+
+
+    def elapsed():
+
+        return (
+            time.perf_counter()
+            -
+            started
+        )
+
+
+    async def put(
+        stage,
+        item,
+    ):
+
+        await stage["queue"].put(
+            item
+        )
+
+        stage["max_queue"] = max(
+            stage["max_queue"],
+            stage["queue"].qsize(),
+        )
+
+
+    def release(regnr):
+
+        active.discard(
+            regnr
+        )
+
+        wake.set()
+
+
+    def snapshot():
+
+        pending = (
+            active
+            | set(requeue)
+            | {
+                regnr
+                for _, _, regnr in retries
+            }
+        )
+
+        return {
+
+            "specs": [
+                [
+                    item["prefix"],
+                    item["start"],
+                    item["end"],
+                ]
+                for item in prefix_ranges
+            ],
+
+            "plan":
+                prefix_ranges,
+
+            "position":
+                stats["position"],
+
+            "pending":
+                sorted(pending),
+
+            "attempts": {
+                regnr: attempts[regnr]
+                for regnr in pending
+                if regnr in attempts
+            },
+
+            "found":
+                found_entries,
+
+            "frontier_seen":
+                frontier_seen or {},
+        }
+
+
+    def write_checkpoint():
+
+        state = snapshot()
+
+        save_checkpoint(
+            state,
+            state_dir,
+            checkpoint_name(
+                prefix_ranges
+            ),
+        )
+
+        return state
+
+
+    def record(
+        regnr,
+        result,
+    ):
+
+        release(
+            regnr
+        )
+
+        blocked = (
+            result == "blocked"
+        )
+
+        if (
+            len(recent_blocked)
+            ==
+            recent_blocked.maxlen
+        ):
+
+            stats[
+                "blocked_in_window"
+            ] -= recent_blocked[0]
+
+        recent_blocked.append(
+            blocked
+        )
+
+        stats[
+            "blocked_in_window"
+        ] += blocked
+
+        if blocked:
+
+            # En 403 er ikke et svar. Pladen prøves
+            # igen og ligger i pending, hvis runnet
+            # stopper, så resume tager den med.
+            schedule_retry(
+                regnr,
+                "403",
+                budgeted=False,
+            )
+
+        else:
+
+            if (
+                regnr in attempts
+                and
+                result != "gave_up"
+            ):
+
+                stats["recovered"] += 1
+
+            stats["done"] += 1
+
+            if stats["done"] % PROGRESS_EVERY == 0:
+
+                print(
+                    f"⏳ {stats['done'] + stats['skipped'] + stats['known']}/{total} | "
+                    f"{stats['done'] / elapsed():.1f} plader/s | "
+                    f"sidekø {page['queue'].qsize()}/{SCAN_QUEUE_SIZE} | "
+                    f"DMR-kø {dmr['queue'].qsize()}/{DMR_QUEUE_SIZE} | "
+                    f"venter på retry {len(retries)}"
+                )
+
+        if (
+            stats["blocked_in_window"]
+            >= BLOCKED_ABORT_THRESHOLD
+            and
+            not stop.is_set()
+        ):
+
+            print(
+                "⛔ Mange HTTP 403 "
+                "fra Bilopslag. "
+                "Stopper dette run."
+            )
+
+            stop.set()
+
+
+    def schedule_retry(
+        regnr,
+        reason,
+        budgeted=True,
+    ):
+        """
+        Lægger pladen i retry-køen med backoff.
+        budgeted=False (403) opgiver aldrig; for
+        mange 403 stopper i stedet hele runnet.
+        """
+
+        attempt = attempts.get(
+            regnr,
+            0,
+        )
+
+        if (
+            budgeted
+            and
+            attempt >= PLATE_RETRY_BUDGET
+        ):
+
+            stats["gave_up"] += 1
+
+            print(
+                f"⚠️ {regnr}: opgivet efter "
+                f"{attempt} nye forsøg ({reason})."
+            )
+
+            record(
+                regnr,
+                "gave_up",
+            )
+
+            return
+
+        attempts[
+            regnr
+        ] = attempt + 1
+
+        stats["retries"] += 1
+
+        heapq.heappush(
+            retries,
+            (
+                time.monotonic()
+                +
+                backoff_delay(
+                    attempt
+                ),
+                next(retry_order),
+                regnr,
+            ),
+        )
+
+        release(
+            regnr
+        )
+
+
+    async def producer():
+
+        # Ved resume springes de plader over, som
+        # allerede er sendt afsted i et tidligere run.
+        fresh = itertools.islice(
+            interleave_plates(
+                prefix_ranges
+            ),
+            stats["position"],
+            None,
+        )
+
+        exhausted = False
+
+        while not stop.is_set():
+
+            if requeue:
+
+                regnr = requeue.popleft()
+
+            elif (
+                retries
+                and
+                retries[0][0] <= time.monotonic()
+            ):
+
+                regnr = heapq.heappop(
+                    retries
+                )[2]
+
+            elif not exhausted:
+
+                regnr = next(
+                    fresh,
+                    None,
+                )
+
+                if regnr is None:
+
+                    exhausted = True
+
+                    continue
+
+                stats["position"] += 1
+
+                if (
+                    negative_cache
+                    and
+                    negative_cache.is_fresh(
+                        regnr,
+                        negative_cache_ttl(
+                            items_by_prefix[
+                                regnr[:-5]
+                            ],
+                            int(regnr[-5:]),
+                        ),
+                    )
+                ):
+
+                    stats["skipped"] += 1
+
+                    continue
+
+                if (
+                    known
+                    and
+                    regnr in known
+                ):
+
+                    stats["known"] += 1
+
+                    # Frontieren flytter sig stadig
+                    # forbi kendte plader.
+                    if frontier_seen is not None:
+
+                        record_frontier(
+                            frontier_seen,
+                            regnr,
+                            parse_date(
+                                known[regnr]
+                            ),
+                        )
+
+                    continue
+
+            elif (
+                active
+                or
+                retries
+            ):
+
+                # Alt er sendt afsted. Vent på, at de
+                # sidste plader bliver færdige, kommer
+                # tilbage i requeue, eller at næste
+                # retry er klar.
+                wake.clear()
+
+                try:
+
+                    await asyncio.wait_for(
+                        wake.wait(),
+                        (
+                            retries[0][0]
+                            -
+                            time.monotonic()
+                            if retries
+                            else None
+                        ),
+                    )
+
+                except asyncio.TimeoutError:
+
+                    pass
+
+                continue
+
+            else:
+
+                break
+
+            active.add(
+                regnr
+            )
+
+            await put(
+                page,
+                regnr,
+            )
+
+        for _ in range(
+            SCAN_WORKERS
+        ):
+
+            await page["queue"].put(
+                None
+            )
+
+
+    async def page_worker():
+
+        while True:
+
+            regnr = await page["queue"].get()
+
+            if regnr is None:
+
+                return
+
+            # Efter stop tømmes køen uden opslag.
+            # Pladen bliver i active og kommer med
+            # i checkpointet.
+            if stop.is_set():
+
+                continue
+
+            step_started = time.perf_counter()
+
+            cached = (
+                vehicle_cache.get(
+                    regnr
+                )
+                if vehicle_cache
+                else None
+            )
+
+            if cached:
+
+                found = (
+                    cached[0],
+                    parse_date(
+                        cached[1]
+                    ),
+                )
+
+            else:
+
+                found = await lookup_vehicle(
+                    session,
+                    regnr,
+                    page["limiter"],
+                    parse_executor,
+                    negative_cache,
+                    vehicle_cache,
+                )
+
+            page["processed"] += 1
+
+            page["busy"] += (
+                time.perf_counter()
+                -
+                step_started
+            )
+
+            if found == "retry":
+
+                schedule_retry(
+                    regnr,
+                    "sideopslag",
+                )
+
+                continue
+
+            if not isinstance(
+                found,
+                tuple,
+            ):
+
+                record(
+                    regnr,
+                    found,
+                )
+
+                continue
+
+            vehicle_id, registration_date = found
+
+            await put(
+                dmr,
+                {
+
+                    "plate":
+                        regnr,
+
+                    "vehicle_id":
+                        vehicle_id,
+
+                    "registration_date":
+                        registration_date,
+
+                    "cached":
+                        bool(cached),
+                },
+            )
+
+
+    async def dmr_worker():
+
+        while True:
+
+            candidate = await dmr["queue"].get()
+
+            if candidate is None:
+
+                return
+
+            if stop.is_set():
+
+                continue
+
+            regnr = candidate["plate"]
+
+            step_started = time.perf_counter()
+
+            insurance = await get_insurance_info(
+                session,
+                candidate["vehicle_id"],
+                dmr["limiter"],
+            )
+
+            dmr["processed"] += 1
+
+            dmr["busy"] += (
+                time.perf_counter()
+                -
+                step_started
+            )
+
+            # Bilopslag kender ikke længere det gemte
+            # id. Send pladen gennem sidetrinnet igen.
+            if (
+                candidate["cached"]
+                and
+                insurance[2] == "404"
+            ):
+
+                vehicle_cache.drop(
+                    regnr
+                )
+
+                requeue.append(
+                    regnr
+                )
+
+                release(
+                    regnr
+                )
+
+                continue
+
+            if insurance[2] in RETRYABLE_DMR_STATUSES:
+
+                schedule_retry(
+                    regnr,
+                    f"DMR {insurance[2]}",
+                )
+
+                continue
+
+            entry = store_plate(
+                regnr,
+                candidate["registration_date"],
+                insurance,
+                plates,
+                processed_plates,
+                frontier_seen,
+                upserter,
+            )
+
+            if entry:
+
+                found_entries.append(
+                    entry
+                )
+
+            record(
+                regnr,
+                "stored",
+            )
+
+
+    async def checkpointer():
+
+        while True:
+
+            await asyncio.sleep(
+                CHECKPOINT_SECONDS
+            )
+
+            write_checkpoint()
+
+
+    def on_signal(name):
+
+        if stop.is_set():
+
+            return
+
+        print(
+            f"🛑 {name} modtaget. "
+            "Gemmer checkpoint og stopper."
+        )
+
+        stop.set()
+
+        wake.set()
+
+        write_checkpoint()
+
+
+    loop = asyncio.get_running_loop()
+
+    handled_signals = []
+
+    for signal_number in (
+        signal.SIGTERM,
+        signal.SIGINT,
+    ):
+
+        try:
+
+            loop.add_signal_handler(
+                signal_number,
+                on_signal,
+                signal_number.name,
+            )
+
+            handled_signals.append(
+                signal_number
+            )
+
+        except (
+            NotImplementedError,
+            RuntimeError,
+        ):
+
+            pass
+
+    # Alle tasks lever i én TaskGroup. Sættes stop
+    # (403-grænsen eller et signal), rejser vagten
+    # ScanAborted, og gruppen annullerer alt på én
+    # gang, også requests der er i gang. De plader
+    # bliver i active og kommer med i checkpointet.
+    try:
+
+        async with asyncio.TaskGroup() as group:
+
+            guard = group.create_task(
+                abort_when_set(
+                    stop
+                )
+            )
+
+            checkpoint_task = group.create_task(
+                checkpointer()
+            )
+
+            dmr_workers = [
+
+                group.create_task(
+                    dmr_worker()
+                )
+
+                for _ in range(
+                    DMR_CONNECTIONS_MAX
+                )
+            ]
+
+            await asyncio.wait(
+                [
+                    group.create_task(
+                        producer()
+                    ),
+                    *(
+                        group.create_task(
+                            page_worker()
+                        )
+                        for _ in range(
+                            SCAN_WORKERS
+                        )
+                    ),
+                ]
+            )
+
+            for _ in dmr_workers:
+
+                await dmr["queue"].put(
+                    None
+                )
+
+            await asyncio.wait(
+                dmr_workers
+            )
+
+            guard.cancel()
+
+            checkpoint_task.cancel()
+
+    except* ScanAborted:
+
+        print(
+            "✋ Pipelinen er afbrudt: "
+            f"{len(active)} plader nåede ikke at blive færdige."
+        )
+
+    for signal_number in handled_signals:
+
+        loop.remove_signal_handler(
+            signal_number
+        )
+
+    if stop.is_set():
+
+        state = write_checkpoint()
+
+        print(
+            "💾 Checkpoint gemt: "
+            f"position {state['position']}, "
+            f"{len(state['pending'])} afventende plader, "
+            f"{len(state['found'])} fund."
+        )
+
+    else:
+
+        name = checkpoint_name(
+            prefix_ranges
+        )
+
+        done = load_checkpoint(
+            state_dir,
+            name,
+        )
+
+        # Kun et checkpoint for præcis disse
+        # intervaller er færdigt nu.
+        if (
+            done
+            and
+            done.get("specs") == snapshot()["specs"]
+        ):
+
+            clear_checkpoint(
+                state_dir,
+                name,
+            )
+
+    stats["completed"] = not stop.is_set()
+
+    print(
+        "📈 Gennemløb: "
+        f"{stats['done']} plader på "
+        f"{elapsed():.1f} s "
+        f"({stats['done'] / max(elapsed(), 0.001):.1f} plader/s) | "
+        f"sprunget over {stats['skipped']} | "
+        f"kendt i Supabase {stats['known']}"
+    )
+
+    print(
+        "🔁 Retries: "
+        f"{stats['retries']} nye forsøg | "
+        f"{stats['recovered']} plader reddet | "
+        f"{stats['gave_up']} opgivet"
+    )
+
+    print(
+        "   "
+        + describe_stage(
+            page,
+            SCAN_WORKERS,
+            elapsed(),
+        )
+    )
+
+    print(
+        "   "
+        + describe_stage(
+            dmr,
+            DMR_CONNECTIONS_MAX,
+            elapsed(),
+        )
+    )
+
+    for stage in (
+        page,
+        dmr,
+    ):
+
+        print(
+            "   "
+            + stage["limiter"].describe()
+        )
+
+    return stats
+
+
+# ============================================================
+# FRONTIER
+# ============================================================
+
+def print_frontier_moves(
+    moved,
+):
+
+    for prefix, number in moved.items():
+
+        print(
+            f"🧭 Ny frontier for {prefix}: "
+            f"{prefix}{number:05d}"
+        )
+
+
+# ============================================================
+# CHECKPOINT
+# ============================================================
+
+def checkpoint_name(
+    prefix_ranges,
+):
+    """
+    Nøglen til checkpoint-filen: seriernes prefixes,
+    fx "EV" eller "EV-EW".
+    """
+
+    return "-".join(
+        sorted(
+            {
+                item["prefix"]
+                for item in prefix_ranges
+            }
+        )
+    )
+
+
+def usable_checkpoint(
+    prefix_ranges,
+    state_dir=None,
+):
+    """
+    Returnerer checkpointet, hvis det er friskt og
+    gælder de samme serier og intervaller.
+    """
+
+    checkpoint = load_checkpoint(
+        state_dir,
+        checkpoint_name(
+            prefix_ranges
+        ),
+    )
+
+    if not checkpoint:
+
+        return None
+
+    specs = [
+        [
+            item["prefix"],
+            item["start"],
+            item["end"],
+        ]
+        for item in prefix_ranges
+    ]
+
+    age_hours = (
+        time.time()
+        -
+        checkpoint.get(
+            "saved_at",
+            0,
+        )
+    ) / 3600
+
+    if (
+        checkpoint.get("specs") != specs
+        or
+        age_hours > CHECKPOINT_MAX_AGE_HOURS
+    ):
+
+        print(
+            "ℹ️ Checkpoint passer ikke til dette "
+            "run og ignoreres."
+        )
+
+        return None
+
+    return checkpoint
+
+
+# ============================================================
+# HOVEDPROGRAM
+# ============================================================
+
+async def check_new_registrations(
+    prefix_ranges,
+    shard=None,
+):
+    """
+    Scanner serierne og gemmer fund i plates.json
+    og Supabase.
+
+    Med shard=(i, N) scannes kun shardens del af
+    pladerne, og fundene skrives som delresultat
+    til merge-trinnet i stedet.
+    """
+
+    print(
+        f"Starter Bilopslag-scanning: "
+        f"{describe_prefix_ranges(prefix_ranges)}"
+    )
+
+    state_dir = (
+        shard_state_dir(
+            shard
+        )
+        if shard
+        else None
+    )
+
+    resume = usable_checkpoint(
+        prefix_ranges,
+        state_dir,
+    )
+
+    if resume:
+
+        prefix_ranges = resume["plan"]
+
+        print(
+            "♻️ Fortsætter fra checkpoint: "
+            f"position {resume['position']}, "
+            f"{len(resume['pending'])} afventende plader, "
+            f"{len(resume['found'])} fund."
+        )
+
+    else:
+
+        plan_prefix_ranges(
+            prefix_ranges,
+            load_frontier(),
+        )
+
+        if shard:
+
+            for item in prefix_ranges:
+
+                item["shard"] = list(
+                    shard
+                )
+
+    for item in prefix_ranges:
+
+        print(
+            f"🎯 {describe_plan(item)}"
+        )
+
+    frontier_seen = dict(
+        (resume or {}).get(
+            "frontier_seen",
+            {},
+        )
+    )
+
+    found_entries = list(
+        (resume or {}).get(
+            "found",
+            [],
+        )
+    )
+
+    cache_started = time.perf_counter()
+
+    negative_cache = (
+        NegativeCache(
+            state_dir
+        )
+        if NEGATIVE_CACHE
+        else None
+    )
+
+    if negative_cache:
+
+        for item in prefix_ranges:
+
+            negative_cache.timestamps(
+                item["prefix"]
+            )
+
+        print(
+            "🗂️ Negativ cache indlæst på "
+            f"{(time.perf_counter() - cache_started) * 1000:.1f} ms."
+        )
+
+    vehicle_cache = (
+        VehicleCache(
+            state_dir / "vehicles.json"
+            if state_dir
+            else None
+        )
+        if VEHICLE_CACHE
+        else None
+    )
+
+    plates = (
+        load_existing_data()
+    )
+
+    # Fund fra det afbrudte run kommer med i
+    # plates.json igen.
+    processed_plates = {
+
+        entry["plate"]
+
+        for entry in found_entries
+    }
+
+    plates.extend(
+        found_entries
+    )
+
+    connector = (
+        aiohttp.TCPConnector(
+            limit=(
+                PAGE_CONNECTIONS_MAX
+                +
+                DMR_CONNECTIONS_MAX
+            ),
+            ttl_dns_cache=300,
+        )
+    )
+
+
+    parse_executor = (
+        ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS
+        )
+        if PARSE_WORKERS > 0
+        else None
+    )
+
+
+    supabase = SupabaseClient()
+
+    upserter = None
+
+    mirror = open_mirror()
+
+    # Plader fra spejlet, som scanningen springer over.
+    known = None
+
+    try:
+
+        async with (
+            aiohttp.ClientSession(
+                connector=connector,
+                headers=BILOPSLAG_HEADERS,
+                cookies=BILOPSLAG_COOKIES,
+            ) as session,
+            supabase,
+        ):
+
+            # Shards rører ikke Supabase; det gør
+            # merge-trinnet.
+            if not shard:
+
+                await delete_old_plates_from_supabase(
+                    supabase,
+                    mirror,
+                )
+
+            # Shards læser spejlet, som run_shards
+            # har synket før start.
+            if mirror is not None and (
+                shard
+                or
+                supabase.configured
+                and
+                await sync_plate_mirror(
+                    mirror,
+                    supabase,
+                )
+            ):
+
+                known = mirror.plate_dates(
+                    [
+                        item["prefix"]
+                        for item in prefix_ranges
+                    ]
+                )
+
+            if (
+                not shard
+                and
+                supabase.configured
+            ):
+
+                upserter = SupabaseUpserter(
+                    supabase
+                )
+
+                upserter.start()
+
+                # Fund fra et afbrudt run sendes igen;
+                # dubletter ignoreres af Supabase.
+                for found in found_entries:
+
+                    upserter.add(
+                        found["company"],
+                        found,
+                    )
+
+            try:
+
+                scan_stats = await scan_range(
+                    session,
+                    plates,
+                    processed_plates,
+                    prefix_ranges,
+                    parse_executor,
+                    frontier_seen,
+                    negative_cache,
+                    vehicle_cache,
+                    found_entries,
+                    resume,
+                    upserter=upserter,
+                    state_dir=state_dir,
+                    known=known,
+                )
+
+            finally:
+
+                # Sidste flush, også når runnet
+                # er afbrudt.
+                if upserter:
+
+                    await upserter.close()
+
+    finally:
+
+        if parse_executor:
+
+            parse_executor.shutdown()
+
+        if mirror is not None:
+
+            mirror.close()
+
+
+    if shard:
+
+        # Frontier og plates.json opdateres
+        # først i merge-trinnet.
+        path = save_shard_result(
+            shard,
+            {
+                "specs": [
+                    [
+                        item["prefix"],
+                        item["start"],
+                        item["end"],
+                    ]
+                    for item in prefix_ranges
+                ],
+                "complete": scan_stats["completed"],
+                "found": found_entries,
+                "frontier_seen": frontier_seen,
+            },
+        )
+
+        print(
+            "📦 Delresultat gemt: "
+            f"{path} ({len(found_entries)} fund)"
+        )
+
+    elif processed_plates:
+
+        save_to_json(
+            plates
+        )
+
+    plates.close()
+
+
+    if negative_cache:
+
+        negative_cache.save()
+
+    if vehicle_cache:
+
+        vehicle_cache.save()
+
+    if not shard:
+
+        print_frontier_moves(
+            save_frontier(
+                frontier_seen
+            )
+        )
+
+
+    print("")
+    print(
+        "========== RESULTAT =========="
+    )
+
+    print(
+        "Behandlede plader: "
+        f"{len(processed_plates)}"
+    )
+
+    print(
+        "Vehicle-udtræk: "
+        f"fast path {EXTRACT_STATS['fast']} | "
+        f"BeautifulSoup {EXTRACT_STATS['soup']} | "
+        f"uden data-vehicle {EXTRACT_STATS['missing']}"
+    )
+
+    print(
+        "Sidelæsning: "
+        f"stoppet efter data-vehicle {PAGE_READ_STATS['early']} | "
+        f"stoppet ved grænse {PAGE_READ_STATS['limit']} | "
+        f"hele siden {PAGE_READ_STATS['full']} | "
+        f"{PAGE_READ_STATS['bytes'] / 1024 / 1024:.1f} MB læst"
+    )
+
+    print(
+        "Tid: "
+        f"netværk {TIMING_STATS['network']:.1f} s | "
+        f"parsing {TIMING_STATS['parse']:.1f} s "
+        f"({PARSE_WORKERS or 'ingen'} parse-processer)"
+    )
+
+    for line in describe_buckets():
+
+        print(
+            f"Rate limit: {line}"
+        )
+
+    if upserter:
+
+        print(
+            "Supabase: "
+            f"{upserter.describe()}"
+        )
+
+    for line in supabase.describe():
+
+        print(
+            f"Supabase {line}"
+        )
+
+    if negative_cache:
+
+        print(
+            "Negativ cache: "
+            f"{negative_cache.stats['hits']} sprunget over "
+            f"({negative_cache.hit_rate():.0%} hitrate) | "
+            f"{negative_cache.stats['recorded']} nye 404"
+        )
+
+    if vehicle_cache:
+
+        print(
+            "Vehicle-cache: "
+            f"{vehicle_cache.stats['hits']} direkte til DMR | "
+            f"{vehicle_cache.stats['stale']} forældede id'er | "
+            f"{vehicle_cache.stats['added']} nye"
+        )
+
+    print(
+        "=============================="
+    )
+
+
+# ============================================================
+# SHARDS
+# ============================================================
+
+def parse_shard(value):
+    """
+    "2/4" -> (2, 4). Shards tælles fra 1.
+    """
+
+    try:
+
+        index, count = (
+            int(part)
+            for part in value.split(
+                "/"
+            )
+        )
+
+    except ValueError:
+
+        raise argparse.ArgumentTypeError(
+            f"Ugyldig shard: {value!r} (brug fx 2/4)."
+        )
+
+    if not 1 <= index <= count:
+
+        raise argparse.ArgumentTypeError(
+            f"Ugyldig shard: {value!r} (i skal være 1..N)."
+        )
+
+    return (
+        index,
+        count,
+    )
+
+
+async def merge_shard_results():
+    """
+    Samler delresultaterne fra alle shards i
+    plates.json, frontieren og én samlet upload
+    til Supabase.
+    """
+
+    results = load_shard_results()
+
+    if not results:
+
+        print(
+            "⚠️ Ingen delresultater at samle."
+        )
+
+        return False
+
+    counts = {
+
+        data["shard"][1]
+
+        for _, data in results
+    }
+
+    if len(counts) > 1:
+
+        print(
+            "❌ Delresultaterne kommer fra forskellige "
+            f"shard-antal ({sorted(counts)}). "
+            "Ryd op og kør igen."
+        )
+
+        return False
+
+    count = counts.pop()
+
+    missing = sorted(
+        set(
+            range(
+                1,
+                count + 1,
+            )
+        )
+        -
+        {
+            data["shard"][0]
+
+            for _, data in results
+        }
+    )
+
+    if missing:
+
+        print(
+            "⚠️ Mangler shards: "
+            + ", ".join(
+                f"{index}/{count}"
+                for index in missing
+            )
+        )
+
+    for _, data in results:
+
+        if not data.get(
+            "complete"
+        ):
+
+            print(
+                "⚠️ Shard {}/{} blev afbrudt "
+                "før tid.".format(
+                    *data["shard"]
+                )
+            )
+
+    found_entries = []
+
+    frontier_seen = {}
+
+    for _, data in results:
+
+        found_entries.extend(
+            data.get(
+                "found",
+                [],
+            )
+        )
+
+        for prefix, number in data.get(
+            "frontier_seen",
+            {},
+        ).items():
+
+            frontier_seen[
+                prefix
+            ] = max(
+                frontier_seen.get(
+                    prefix,
+                    0,
+                ),
+                number,
+            )
+
+    plates = (
+        load_existing_data()
+    )
+
+    added = plates.extend(
+        found_entries
+    )
+
+    if added:
+
+        save_to_json(
+            plates
+        )
+
+    plates.close()
+
+    print(
+        f"🧩 {len(results)} delresultater samlet: "
+        f"{len(found_entries)} fund, "
+        f"{len(added)} nye i plates.json."
+    )
+
+    mirror = open_mirror()
+
+    try:
+
+        async with SupabaseClient() as supabase:
+
+            await delete_old_plates_from_supabase(
+                supabase,
+                mirror,
+            )
+
+            uploaded = await upload_plates_to_supabase(
+                supabase,
+                found_entries,
+            )
+
+    finally:
+
+        if mirror is not None:
+
+            mirror.close()
+
+    print(
+        "☁️ Supabase: "
+        f"{uploaded}/{len(found_entries)} plader sendt."
+    )
+
+    for line in supabase.describe():
+
+        print(
+            f"Supabase {line}"
+        )
+
+    print_frontier_moves(
+        save_frontier(
+            frontier_seen
+        )
+    )
+
+    if uploaded < len(found_entries):
+
+        # Delresultaterne bliver liggende, så
+        # merge kan køres igen.
+        return False
+
+    for path, _ in results:
+
+        path.unlink(
+            missing_ok=True
+        )
+
+    return True
+
+
+def run_shards(
+    count,
+    prefix_specs,
+):
+    """
+    Kører count shards som lokale processer og
+    samler resultatet bagefter.
+    """
+
+    asyncio.run(
+        prepare_plate_mirror()
+    )
+
+    processes = [
+
+        subprocess.Popen(
+            [
+                sys.executable,
+                str(
+                    Path(__file__).resolve()
+                ),
+                "--shard",
+                f"{index}/{count}",
+                *prefix_specs,
+            ]
+        )
+
+        for index in range(
+            1,
+            count + 1,
+        )
+    ]
+
+    failed = [
+
+        index
+
+        for index, process in enumerate(
+            processes,
+            start=1,
+        )
+
+        if process.wait() != 0
+    ]
+
+    if failed:
+
+        print(
+            "⚠️ Shards fejlede: "
+            + ", ".join(
+                f"{index}/{count}"
+                for index in failed
+            )
+        )
+
+    return asyncio.run(
+        merge_shard_results()
+    )
+
+
+# ============================================================
+# START
+# ============================================================
+
+def parse_arguments(argv):
+
+    parser = argparse.ArgumentParser(
+        description=(
+            "Scanner nummerplade-serier "
+            "på Bilopslag."
+        ),
+    )
+
+    parser.add_argument(
+        "specs",
+        nargs="*",
+        help='Serier, fx EV eller "EW:20000-30000".',
+    )
+
+    mode = parser.add_mutually_exclusive_group()
+
+    mode.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="i/N",
+        help=(
+            "Scan kun shard i af N og skriv et "
+            "delresultat til merge-trinnet."
+        ),
+    )
+
+    mode.add_argument(
+        "--shards",
+        type=int,
+        metavar="N",
+        help=(
+            "Kør N shards som lokale processer "
+            "og saml resultatet."
+        ),
+    )
+
+    mode.add_argument(
+        "--merge",
+        action="store_true",
+        help=(
+            "Saml delresultater i plates.json "
+            "og Supabase."
+        ),
+    )
+
+    return parser.parse_args(
+        argv
+    )
+
+
+def main(
+    prefix_specs=None,
+):
+    """
+    Scanner en eller flere serier over én fælles
+    session, forbindelses-pool og plates.json.
+
+    Uden argumenter bruges kommandolinjen
+    (fx EV EW:20000-30000) eller SCAN_PREFIXES.
+    Med --shard i/N, --shards N og --merge kan
+    scanningen deles over flere processer eller jobs.
+    """
+
+    args = parse_arguments(
+        sys.argv[1:]
+        if prefix_specs is None
+        else list(prefix_specs)
+    )
+
+    if args.merge:
+
+        print(
+            "Samler delresultater."
+        )
+
+        asyncio.run(
+            merge_shard_results()
+        )
+
+        return
+
+    prefix_specs = (
+        args.specs
+        or SCAN_PREFIXES
+    )
+
+    prefix_ranges = parse_prefix_specs(
+        prefix_specs
+    )
+
+    label = "+".join(
+
+        item["prefix"]
+
+        for item in prefix_ranges
+    )
+
+    if args.shard:
+
+        label += " shard {}/{}".format(
+            *args.shard
+        )
+
+        # Grænserne mod hver host gælder
+        # for alle shards tilsammen.
+        share_rate_limits(
+            args.shard[1]
+        )
+
+    print(
+        f"{label}-script startet."
+    )
+
+    if args.shards:
+
+        run_shards(
+            args.shards,
+            args.specs,
+        )
+
+    elif args.shard:
+
+        asyncio.run(
+            check_new_registrations(
+                prefix_ranges,
+                args.shard,
+            )
+        )
+
+    else:
+
+        asyncio.run(
+            check_new_registrations(
+                prefix_ranges
+            )
+        )
+
+    print(
+        f"{label}-script færdigt."
+    )
+
+
+if __name__ == "__main__":
+
+    main()
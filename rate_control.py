@@ -0,0 +1,870 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+# ============================================================
+# KONFIGURATION
+# ============================================================
+
+# "0" låser grænserne til deres startværdi.
+ADAPTIVE_CONCURRENCY = (
+    os.getenv(
+        "ADAPTIVE_CONCURRENCY",
+        "1",
+    )
+    == "1"
+)
+
+# Additiv stigning: ca. +AIMD_INCREASE pr. "runde"
+# af vellykkede requests.
+AIMD_INCREASE = float(
+    os.getenv(
+        "AIMD_INCREASE",
+        "1.0",
+    )
+)
+
+# Multiplikativ nedgang ved 429/403/timeout.
+AIMD_DECREASE = float(
+    os.getenv(
+        "AIMD_DECREASE",
+        "0.5",
+    )
+)
+
+# Latency over baseline * tolerance regnes som
+# overbelastning.
+AIMD_LATENCY_TOLERANCE = float(
+    os.getenv(
+        "AIMD_LATENCY_TOLERANCE",
+        "2.5",
+    )
+)
+
+# Højst én nedgang pr. cooldown, så en bølge af
+# 429'er ikke halverer grænsen mange gange.
+AIMD_COOLDOWN_SECONDS = float(
+    os.getenv(
+        "AIMD_COOLDOWN_SECONDS",
+        "1.0",
+    )
+)
+
+# Requests pr. sekund pr. host. "0" betyder ingen
+# pacing; Retry-After overholdes stadig.
+RATE_LIMIT_RPS = float(
+    os.getenv(
+        "RATE_LIMIT_RPS",
+        "0",
+    )
+)
+
+RATE_LIMIT_BURST = float(
+    os.getenv(
+        "RATE_LIMIT_BURST",
+        "10",
+    )
+)
+
+# Overstyring pr. host, fx
+# "bilopslag.nu=5:10,www.tjekbil.dk=2:4" (rps:burst).
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS",
+    "",
+)
+
+# Loft over en Retry-After-pause, så en fejlagtig
+# header ikke parkerer hele runnet.
+RETRY_AFTER_MAX_SECONDS = float(
+    os.getenv(
+        "RETRY_AFTER_MAX_SECONDS",
+        "120",
+    )
+)
+
+# Backoff før et nyt forsøg: tilfældig ventetid op til
+# RETRY_BASE_SECONDS * 2^forsøg, dog højst RETRY_MAX_DELAY_SECONDS.
+RETRY_BASE_SECONDS = float(
+    os.getenv(
+        "RETRY_BASE_SECONDS",
+        "1.0",
+    )
+)
+
+RETRY_MAX_DELAY_SECONDS = float(
+    os.getenv(
+        "RETRY_MAX_DELAY_SECONDS",
+        "30",
+    )
+)
+
+# Statuskoder der betyder "skru ned".
+OVERLOAD_STATUSES = {
+    403,
+    429,
+    502,
+    503,
+    504,
+}
+
+
+# ============================================================
+# BACKOFF
+# ============================================================
+
+def backoff_delay(
+    attempt,
+    base=None,
+    cap=None,
+):
+    """
+    Eksponentiel backoff med fuld jitter.
+    attempt starter ved 0.
+    """
+
+    base = (
+        RETRY_BASE_SECONDS
+        if base is None
+        else base
+    )
+
+    cap = (
+        RETRY_MAX_DELAY_SECONDS
+        if cap is None
+        else cap
+    )
+
+    return random.uniform(
+        0,
+        min(
+            cap,
+            base * 2 ** attempt,
+        ),
+    )
+
+
+# ============================================================
+# AIMD-BEGRÆNSER
+# ============================================================
+
+class AdaptiveLimiter:
+    """
+    Grænse for samtidige requests, der justeres
+    løbende (AIMD).
+
+    Sund latency og succes hæver grænsen additivt.
+    429, 403, timeouts og latency-inflation sænker
+    den multiplikativt.
+
+    Brug:
+
+        async with limiter.slot() as slot:
+            ...
+            if response.status in OVERLOAD_STATUSES:
+                slot.overloaded()
+    """
+
+    def __init__(
+        self,
+        name,
+        initial,
+        maximum=None,
+        minimum=1,
+    ):
+
+        if not ADAPTIVE_CONCURRENCY:
+
+            minimum = maximum = initial
+
+        # Under --shards deler processerne også
+        # samtidigheden, så den samlede top mod
+        # hosten er den konfigurerede.
+        initial = max(
+            1,
+            initial // RATE_LIMIT_SHARE,
+        )
+
+        maximum = (
+            max(
+                1,
+                maximum // RATE_LIMIT_SHARE,
+            )
+            if maximum
+            else maximum
+        )
+
+        self.name = name
+
+        self.minimum = max(
+            1,
+            minimum,
+        )
+
+        self.maximum = max(
+            self.minimum,
+            maximum or initial,
+        )
+
+        self.limit = float(
+            min(
+                max(
+                    initial,
+                    self.minimum,
+                ),
+                self.maximum,
+            )
+        )
+
+        self.in_flight = 0
+
+        self.baseline = None
+
+        self.last_decrease = 0.0
+
+        self.condition = None
+
+        self.stats = {
+            "ok": 0,
+            "overload": 0,
+            "error": 0,
+            "increases": 0,
+            "decreases": 0,
+            "peak": int(self.limit),
+        }
+
+    def current(self):
+
+        return int(
+            self.limit
+        )
+
+    def slot(self):
+
+        return LimiterSlot(
+            self
+        )
+
+    async def acquire(self):
+
+        if self.condition is None:
+
+            self.condition = asyncio.Condition()
+
+        async with self.condition:
+
+            await self.condition.wait_for(
+                lambda: (
+                    self.in_flight
+                    <
+                    self.current()
+                )
+            )
+
+            self.in_flight += 1
+
+    async def release(
+        self,
+        latency,
+        outcome,
+    ):
+
+        if outcome == "cancelled":
+
+            # Et afbrudt kald (fx TaskGroup efter 403)
+            # siger intet om serveren; pladsen gives
+            # blot tilbage.
+            await self.free()
+
+            return
+
+        before = self.current()
+
+        if (
+            outcome == "ok"
+            and
+            self.baseline is not None
+            and
+            latency
+            >
+            self.baseline * AIMD_LATENCY_TOLERANCE
+        ):
+
+            outcome = "slow"
+
+        self.stats[
+            "overload"
+            if outcome == "slow"
+            else outcome
+        ] += 1
+
+        if outcome == "ok":
+
+            self.baseline = (
+                latency
+                if self.baseline is None
+                else (
+                    0.95 * self.baseline
+                    +
+                    0.05 * latency
+                )
+            )
+
+            self.limit = min(
+                self.maximum,
+                self.limit
+                +
+                AIMD_INCREASE / self.limit,
+            )
+
+        elif outcome in (
+            "overload",
+            "slow",
+        ):
+
+            if outcome == "slow":
+
+                # Lad baseline følge med langsomt, så
+                # en varig stigning ikke låser grænsen
+                # i bunden.
+                self.baseline = (
+                    0.99 * self.baseline
+                    +
+                    0.01 * latency
+                )
+
+            now = time.monotonic()
+
+            if (
+                now - self.last_decrease
+                >= AIMD_COOLDOWN_SECONDS
+            ):
+
+                self.limit = max(
+                    self.minimum,
+                    self.limit * AIMD_DECREASE,
+                )
+
+                self.last_decrease = now
+
+        after = self.current()
+
+        if after > before:
+
+            self.stats["increases"] += 1
+
+            self.stats["peak"] = max(
+                self.stats["peak"],
+                after,
+            )
+
+        elif after < before:
+
+            self.stats["decreases"] += 1
+
+        await self.free()
+
+    async def free(self):
+
+        async with self.condition:
+
+            self.in_flight -= 1
+
+            self.condition.notify_all()
+
+    def describe(self):
+
+        return (
+            f"{self.name}: grænse nu {self.current()} "
+            f"(min {self.minimum}, max {self.maximum}, "
+            f"top {self.stats['peak']}) | "
+            f"{self.stats['increases']} op / "
+            f"{self.stats['decreases']} ned | "
+            f"ok {self.stats['ok']} | "
+            f"overbelastet {self.stats['overload']} | "
+            f"fejl {self.stats['error']}"
+        )
+
+
+class LimiterSlot:
+
+    def __init__(
+        self,
+        limiter,
+    ):
+
+        self.limiter = limiter
+
+        self.outcome = "ok"
+
+        self.started = None
+
+    def overloaded(self):
+
+        self.outcome = "overload"
+
+    def failed(self):
+
+        self.outcome = "error"
+
+    def cancelled(self):
+
+        self.outcome = "cancelled"
+
+    def observe_status(
+        self,
+        status,
+    ):
+
+        if status in OVERLOAD_STATUSES:
+
+            self.overloaded()
+
+        elif status >= 500:
+
+            self.failed()
+
+    def observe_error(
+        self,
+        error,
+    ):
+
+        if isinstance(
+            error,
+            asyncio.TimeoutError,
+        ):
+
+            self.overloaded()
+
+        else:
+
+            self.failed()
+
+    async def __aenter__(self):
+
+        await self.limiter.acquire()
+
+        self.started = time.monotonic()
+
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type,
+        exc,
+        traceback,
+    ):
+
+        if exc_type is not None:
+
+            if issubclass(
+                exc_type,
+                asyncio.TimeoutError,
+            ):
+
+                self.overloaded()
+
+            elif issubclass(
+                exc_type,
+                asyncio.CancelledError,
+            ):
+
+                self.cancelled()
+
+            else:
+
+                self.failed()
+
+        await self.limiter.release(
+            time.monotonic() - self.started,
+            self.outcome,
+        )
+
+        return False
+
+
+# ============================================================
+# TOKEN BUCKET PR. HOST
+# ============================================================
+
+def parse_rate_limits(value):
+
+    limits = {}
+
+    for item in value.split(","):
+
+        host, _, setting = (
+            item.strip().partition("=")
+        )
+
+        if not host or not setting:
+
+            continue
+
+        rate, _, burst = (
+            setting.partition(":")
+        )
+
+        limits[
+            host.lower()
+        ] = (
+            float(rate),
+            float(burst or RATE_LIMIT_BURST),
+        )
+
+    return limits
+
+
+def parse_retry_after(value):
+    """
+    Retry-After som sekunder eller HTTP-dato.
+    Returnerer None, hvis headeren mangler.
+    """
+
+    if not value:
+
+        return None
+
+    value = value.strip()
+
+    try:
+
+        seconds = float(
+            value
+        )
+
+    except ValueError:
+
+        try:
+
+            seconds = (
+                parsedate_to_datetime(
+                    value
+                ).timestamp()
+                -
+                time.time()
+            )
+
+        except (
+            TypeError,
+            ValueError,
+        ):
+
+            return None
+
+    return min(
+        max(
+            seconds,
+            0.0,
+        ),
+        RETRY_AFTER_MAX_SECONDS,
+    )
+
+
+class TokenBucket:
+    """
+    Fordeler requests jævnt over tid for én host.
+
+    Hver request reserverer en token; er bucketen
+    tom, venter den til der er fyldt op. En
+    Retry-After sætter hele bucketen på pause, så
+    alle coroutines i processen holder igen.
+    """
+
+    def __init__(
+        self,
+        host,
+        rate,
+        burst,
+    ):
+
+        self.host = host
+
+        self.rate = rate
+
+        self.burst = max(
+            1.0,
+            burst,
+        )
+
+        self.tokens = self.burst
+
+        self.updated = time.monotonic()
+
+        self.paused_until = 0.0
+
+        # Deles også med synkrone kald (requests).
+        self.lock = threading.Lock()
+
+        self.stats = {
+            "requests": 0,
+            "waits": 0,
+            "waited": 0.0,
+            "pauses": 0,
+        }
+
+    def reserve(self):
+
+        with self.lock:
+
+            now = time.monotonic()
+
+            delay = 0.0
+
+            if self.rate > 0:
+
+                self.tokens = min(
+                    self.burst,
+                    self.tokens
+                    +
+                    (now - self.updated)
+                    * self.rate,
+                )
+
+                self.updated = now
+
+                self.tokens -= 1
+
+                if self.tokens < 0:
+
+                    delay = (
+                        -self.tokens
+                        / self.rate
+                    )
+
+            self.stats["requests"] += 1
+
+            return max(
+                delay,
+                self.paused_until - now,
+            )
+
+    def pause_remaining(self):
+
+        return (
+            self.paused_until
+            -
+            time.monotonic()
+        )
+
+    def note_wait(
+        self,
+        delay,
+    ):
+
+        if delay > 0:
+
+            self.stats["waits"] += 1
+
+            self.stats["waited"] += delay
+
+    async def acquire(self):
+
+        delay = self.reserve()
+
+        self.note_wait(
+            delay
+        )
+
+        if delay > 0:
+
+            await asyncio.sleep(
+                delay
+            )
+
+        # En Retry-After kan være kommet, mens
+        # vi ventede på vores token.
+        while self.pause_remaining() > 0:
+
+            await asyncio.sleep(
+                self.pause_remaining()
+            )
+
+    def acquire_sync(self):
+
+        delay = self.reserve()
+
+        self.note_wait(
+            delay
+        )
+
+        if delay > 0:
+
+            time.sleep(
+                delay
+            )
+
+        while self.pause_remaining() > 0:
+
+            time.sleep(
+                self.pause_remaining()
+            )
+
+    def pause(
+        self,
+        seconds,
+    ):
+
+        with self.lock:
+
+            until = (
+                time.monotonic()
+                +
+                seconds
+            )
+
+            if until > self.paused_until:
+
+                self.paused_until = until
+
+                self.stats["pauses"] += 1
+
+                print(
+                    f"⏸️ {self.host}: Retry-After, "
+                    f"pause i {seconds:.1f} s."
+                )
+
+    def observe_response(
+        self,
+        status,
+        headers,
+    ):
+        """
+        Sætter bucketen på pause, hvis et 429/503
+        har en Retry-After-header.
+        """
+
+        if status not in (
+            429,
+            503,
+        ):
+
+            return None
+
+        seconds = parse_retry_after(
+            headers.get(
+                "Retry-After"
+            )
+        )
+
+        if seconds:
+
+            self.pause(
+                seconds
+            )
+
+        return seconds
+
+    def describe(self):
+
+        rate = (
+            f"{self.rate:g}/s, burst {self.burst:g}"
+            if self.rate > 0
+            else "uden pacing"
+        )
+
+        return (
+            f"{self.host} ({rate}): "
+            f"{self.stats['requests']} requests | "
+            f"{self.stats['waits']} ventende, "
+            f"samlet ventetid {self.stats['waited']:.1f} s | "
+            f"{self.stats['pauses']} Retry-After-pauser"
+        )
+
+
+BUCKETS = {}
+
+BUCKETS_LOCK = threading.Lock()
+
+# Antal processer (shards) der deler grænserne ovenfor
+# og AdaptiveLimiter-grænserne. Hver proces får sin
+# andel, så den samlede rate og samtidighed mod
+# hosten er den konfigurerede.
+RATE_LIMIT_SHARE = 1
+
+
+def share_rate_limits(count):
+
+    global RATE_LIMIT_SHARE
+
+    RATE_LIMIT_SHARE = max(
+        1,
+        int(count),
+    )
+
+
+def get_bucket(url):
+    """
+    Den fælles bucket for url'ens host.
+    """
+
+    host = (
+        urlsplit(url).hostname
+        or url
+    ).lower()
+
+    with BUCKETS_LOCK:
+
+        if host not in BUCKETS:
+
+            rate, burst = parse_rate_limits(
+                RATE_LIMITS
+            ).get(
+                host,
+                (
+                    RATE_LIMIT_RPS,
+                    RATE_LIMIT_BURST,
+                ),
+            )
+
+            BUCKETS[
+                host
+            ] = TokenBucket(
+                host,
+                rate / RATE_LIMIT_SHARE,
+                burst / RATE_LIMIT_SHARE,
+            )
+
+        return BUCKETS[
+            host
+        ]
+
+
+def describe_buckets():
+
+    return [
+
+        bucket.describe()
+
+        for bucket in BUCKETS.values()
+    ]
+
+
+# ============================================================
+# AFBRYDELSE
+# ============================================================
+
+class ScanAborted(Exception):
+    """
+    Rejses i en TaskGroup, når opslagene skal
+    stoppe (fx ved blokering). Gruppen annullerer
+    så alle søskende, også requests der er i gang.
+    """
+
+
+async def abort_when_set(
+    event,
+):
+    """
+    Vagt-task til en TaskGroup: afbryder gruppen,
+    så snart event sættes.
+    """
+
+    await event.wait()
+
+    raise ScanAborted
@@ -0,0 +1,760 @@
+import os
+import time
+
+from array import array
+from datetime import datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from json_codec import (
+    JSONDecodeError,
+    dumps,
+    load_file,
+)
+
+
+# ============================================================
+# KONFIGURATION
+# ============================================================
+
+REPO_ROOT = Path(__file__).resolve().parent
+
+# Tilstand som prefix-scanneren gemmer mellem runs.
+STATE_DIR = Path(
+    os.getenv(
+        "SCAN_STATE_DIR",
+        REPO_ROOT / ".scan_state",
+    )
+)
+
+COPENHAGEN = ZoneInfo(
+    "Europe/Copenhagen"
+)
+
+
+# ============================================================
+# HJÆLPEFUNKTIONER
+# ============================================================
+
+def read_json_file(
+    path,
+    default,
+):
+
+    try:
+
+        return load_file(
+            path
+        )
+
+    except (
+        FileNotFoundError,
+        JSONDecodeError,
+    ):
+
+        return default
+
+
+def replace_file(
+    path,
+    body,
+):
+    """
+    Skriver til en midlertidig fil og bytter den
+    ind, så et afbrudt run ikke efterlader en
+    halv fil.
+    """
+
+    path = Path(
+        path
+    )
+
+    path.parent.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    temp_path = path.with_name(
+        f"{path.name}.tmp"
+    )
+
+    with open(
+        temp_path,
+        "wb",
+    ) as file:
+
+        file.write(
+            body
+        )
+
+    os.replace(
+        temp_path,
+        path,
+    )
+
+
+def write_json_file(
+    path,
+    data,
+):
+
+    replace_file(
+        path,
+        dumps(
+            data
+        ),
+    )
+
+
+# ============================================================
+# SQLITE-META
+# ============================================================
+
+META_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SQLiteMeta:
+    """
+    Nøgle/værdi i tabellen meta (META_SCHEMA) for
+    klasser med self.connection. set_meta åbner
+    ingen transaktion; kalderen committer.
+    """
+
+    def get_meta(
+        self,
+        key,
+    ):
+
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = ?",
+            (key,),
+        ).fetchone()
+
+        return (
+            row[0]
+            if row
+            else None
+        )
+
+    def set_meta(
+        self,
+        key,
+        value,
+    ):
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO meta (key, value) "
+            "VALUES (?, ?)",
+            (
+                key,
+                value,
+            ),
+        )
+
+
+# ============================================================
+# FRONTIER
+# ============================================================
+
+def frontier_path():
+
+    return (
+        STATE_DIR
+        / "frontier.json"
+    )
+
+
+def load_frontier():
+    """
+    Returnerer {prefix: højeste nummer} for de
+    serier, hvor en frontier er kendt.
+    """
+
+    data = read_json_file(
+        frontier_path(),
+        {},
+    )
+
+    frontier = {}
+
+    for prefix, item in data.items():
+
+        try:
+
+            frontier[
+                prefix
+            ] = int(
+                item["number"]
+            )
+
+        except (
+            KeyError,
+            TypeError,
+            ValueError,
+        ):
+
+            continue
+
+    return frontier
+
+
+def save_frontier(
+    seen,
+):
+    """
+    Fletter dette runs fund ind i den
+    gemte frontier. Frontieren flyttes kun frem.
+    """
+
+    data = read_json_file(
+        frontier_path(),
+        {},
+    )
+
+    now = datetime.now(
+        COPENHAGEN
+    ).isoformat(
+        timespec="seconds"
+    )
+
+    changed = {}
+
+    for prefix, number in seen.items():
+
+        previous = (
+            data.get(
+                prefix,
+                {},
+            ).get(
+                "number",
+                0,
+            )
+        )
+
+        if number <= previous:
+
+            continue
+
+        data[
+            prefix
+        ] = {
+
+            "number":
+                number,
+
+            "updated_at":
+                now,
+        }
+
+        changed[
+            prefix
+        ] = number
+
+    if changed:
+
+        write_json_file(
+            frontier_path(),
+            data,
+        )
+
+    return changed
+
+
+# ============================================================
+# NEGATIV CACHE (HTTP 404)
+# ============================================================
+
+# Numre 00000-99999 pr. serie.
+NEGATIVE_CACHE_SIZE = 100000
+
+
+class NegativeCache:
+    """
+    Tidspunkt for seneste HTTP 404 pr. plade.
+
+    Hver serie er et array af unix-tider (0 = ukendt),
+    gemt som rå bytes, så indlæsning er én læsning
+    på 400 KB frem for JSON-parsing.
+    """
+
+    def __init__(
+        self,
+        directory=None,
+    ):
+
+        self.directory = Path(
+            directory
+            or STATE_DIR
+        )
+
+        self.series = {}
+
+        self.dirty = set()
+
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "recorded": 0,
+        }
+
+    def path(
+        self,
+        prefix,
+    ):
+
+        return (
+            self.directory
+            / f"404-{prefix}.bin"
+        )
+
+    def timestamps(
+        self,
+        prefix,
+    ):
+
+        if prefix not in self.series:
+
+            values = array("I")
+
+            try:
+
+                values.frombytes(
+                    self.path(
+                        prefix
+                    ).read_bytes()
+                )
+
+            except (
+                FileNotFoundError,
+                ValueError,
+            ):
+
+                pass
+
+            if len(values) != NEGATIVE_CACHE_SIZE:
+
+                values = array(
+                    "I",
+                    bytes(
+                        4 * NEGATIVE_CACHE_SIZE
+                    ),
+                )
+
+            self.series[
+                prefix
+            ] = values
+
+        return self.series[
+            prefix
+        ]
+
+    def is_fresh(
+        self,
+        regnr,
+        ttl_seconds,
+        now=None,
+    ):
+        """
+        True hvis pladen gav 404 for under
+        ttl_seconds siden og kan springes over.
+        """
+
+        recorded_at = self.timestamps(
+            regnr[:-5]
+        )[
+            int(regnr[-5:])
+        ]
+
+        fresh = (
+            recorded_at > 0
+            and
+            (now or time.time()) - recorded_at
+            < ttl_seconds
+        )
+
+        self.stats[
+            "hits" if fresh else "misses"
+        ] += 1
+
+        return fresh
+
+    def record(
+        self,
+        regnr,
+        now=None,
+    ):
+
+        prefix = regnr[:-5]
+
+        self.timestamps(
+            prefix
+        )[
+            int(regnr[-5:])
+        ] = int(
+            now or time.time()
+        )
+
+        self.dirty.add(
+            prefix
+        )
+
+        self.stats[
+            "recorded"
+        ] += 1
+
+    def forget(
+        self,
+        regnr,
+    ):
+
+        prefix = regnr[:-5]
+
+        values = self.timestamps(
+            prefix
+        )
+
+        number = int(
+            regnr[-5:]
+        )
+
+        if values[number]:
+
+            values[number] = 0
+
+            self.dirty.add(
+                prefix
+            )
+
+    def hit_rate(self):
+
+        checked = (
+            self.stats["hits"]
+            +
+            self.stats["misses"]
+        )
+
+        return (
+            self.stats["hits"] / checked
+            if checked
+            else 0.0
+        )
+
+    def save(self):
+
+        for prefix in sorted(
+            self.dirty
+        ):
+
+            replace_file(
+                self.path(
+                    prefix
+                ),
+                self.series[
+                    prefix
+                ].tobytes(),
+            )
+
+        self.dirty.clear()
+
+
+# ============================================================
+# VEHICLE-CACHE (PLADE -> BILOPSLAG ID)
+# ============================================================
+
+class VehicleCache:
+    """
+    Plade -> (vehicle_id, første registrering).
+
+    Med et kendt id kan DMR-opslaget laves direkte
+    uden at hente og parse pladesiden.
+    """
+
+    def __init__(
+        self,
+        path=None,
+    ):
+
+        self.path = Path(
+            path
+            or STATE_DIR / "vehicles.json"
+        )
+
+        self.vehicles = read_json_file(
+            self.path,
+            {},
+        )
+
+        if not isinstance(
+            self.vehicles,
+            dict,
+        ):
+
+            self.vehicles = {}
+
+        self.dirty = False
+
+        self.stats = {
+            "hits": 0,
+            "stale": 0,
+            "added": 0,
+        }
+
+    def get(
+        self,
+        regnr,
+    ):
+
+        cached = self.vehicles.get(
+            regnr
+        )
+
+        if not cached:
+
+            return None
+
+        self.stats["hits"] += 1
+
+        vehicle_id, registration_date = cached
+
+        return (
+            vehicle_id,
+            registration_date,
+        )
+
+    def put(
+        self,
+        regnr,
+        vehicle_id,
+        registration_date,
+    ):
+
+        value = [
+            vehicle_id,
+            registration_date,
+        ]
+
+        if self.vehicles.get(
+            regnr
+        ) == value:
+
+            return
+
+        self.vehicles[
+            regnr
+        ] = value
+
+        self.dirty = True
+
+        self.stats["added"] += 1
+
+    def drop(
+        self,
+        regnr,
+    ):
+
+        if self.vehicles.pop(
+            regnr,
+            None,
+        ):
+
+            self.dirty = True
+
+            self.stats["stale"] += 1
+
+    def save(self):
+
+        if not self.dirty:
+
+            return
+
+        write_json_file(
+            self.path,
+            self.vehicles,
+        )
+
+        self.dirty = False
+
+
+# ============================================================
+# CHECKPOINT
+# ============================================================
+
+def checkpoint_path(
+    directory=None,
+    name=None,
+):
+    """
+    Én fil pr. sæt af serier (checkpoint-EV.json), så
+    et EP-run ikke overskriver eller sletter et
+    EV-runs checkpoint.
+    """
+
+    return (
+        Path(
+            directory
+            or STATE_DIR
+        )
+        / (
+            f"checkpoint-{name}.json"
+            if name
+            else "checkpoint.json"
+        )
+    )
+
+
+def load_checkpoint(
+    directory=None,
+    name=None,
+):
+
+    data = read_json_file(
+        checkpoint_path(
+            directory,
+            name,
+        ),
+        None,
+    )
+
+    if not isinstance(
+        data,
+        dict,
+    ):
+
+        return None
+
+    return data
+
+
+def save_checkpoint(
+    data,
+    directory=None,
+    name=None,
+):
+
+    write_json_file(
+        checkpoint_path(
+            directory,
+            name,
+        ),
+        {
+            **data,
+            "saved_at": time.time(),
+        },
+    )
+
+
+def clear_checkpoint(
+    directory=None,
+    name=None,
+):
+
+    checkpoint_path(
+        directory,
+        name,
+    ).unlink(
+        missing_ok=True
+    )
+
+
+# ============================================================
+# SHARDS
+# ============================================================
+
+# Delresultater fra shards, som merge-trinnet samler.
+# I en workflow er det mappen, jobs deler som artifact.
+SHARD_RESULTS_DIR = Path(
+    os.getenv(
+        "SHARD_RESULTS_DIR",
+        STATE_DIR / "shards",
+    )
+)
+
+
+def shard_state_dir(
+    shard,
+):
+    """
+    Egen tilstandsmappe pr. shard, så shards ikke
+    overskriver hinandens caches og checkpoint.
+    Samme shard får altid de samme plader, så
+    cachen passer også i næste run.
+    """
+
+    index, count = shard
+
+    return (
+        STATE_DIR
+        / f"shard-{index}-of-{count}"
+    )
+
+
+def shard_result_path(
+    shard,
+):
+
+    index, count = shard
+
+    return (
+        SHARD_RESULTS_DIR
+        / f"plates-shard-{index}-of-{count}.json"
+    )
+
+
+def save_shard_result(
+    shard,
+    data,
+):
+
+    path = shard_result_path(
+        shard
+    )
+
+    write_json_file(
+        path,
+        {
+            **data,
+            "shard": list(shard),
+            "finished_at": datetime.now(
+                COPENHAGEN
+            ).isoformat(
+                timespec="seconds"
+            ),
+        },
+    )
+
+    return path
+
+
+def load_shard_results():
+
+    results = []
+
+    for path in sorted(
+        SHARD_RESULTS_DIR.glob(
+            "plates-shard-*-of-*.json"
+        )
+    ):
+
+        data = read_json_file(
+            path,
+            None,
+        )
+
+        if isinstance(
+            data,
+            dict,
+        ):
+
+            results.append(
+                (
+                    path,
+                    data,
+                )
+            )
+
+    return results
@@ -0,0 +1,1055 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+
+from json_codec import (
+    dumps,
+    loads,
+)
+from rate_control import (
+    backoff_delay,
+)
+
+
+# ============================================================
+# KONFIGURATION
+# ============================================================
+
+SUPABASE_URL = os.getenv(
+    "SUPABASE_URL",
+    "",
+).rstrip("/")
+
+SUPABASE_SERVICE_ROLE_KEY = os.getenv(
+    "SUPABASE_SERVICE_ROLE_KEY",
+    "",
+)
+
+# Samlet timeout pr. kald i sekunder.
+SUPABASE_TIMEOUT = float(
+    os.getenv(
+        "SUPABASE_TIMEOUT",
+        "30",
+    )
+)
+
+# Forbindelser i keep-alive-poolen. Alle kald i et
+# run genbruger dem i stedet for nye TLS-handshakes.
+SUPABASE_CONNECTIONS = int(
+    os.getenv(
+        "SUPABASE_CONNECTIONS",
+        "4",
+    )
+)
+
+# Rækker pr. side ved select og pr. request ved upsert.
+SUPABASE_PAGE_SIZE = int(
+    os.getenv(
+        "SUPABASE_PAGE_SIZE",
+        "1000",
+    )
+)
+
+SUPABASE_UPSERT_CHUNK = int(
+    os.getenv(
+        "SUPABASE_UPSERT_CHUNK",
+        "250",
+    )
+)
+
+# Nye forsøg for en select, der fejler med netværksfejl,
+# 429 eller 5xx, før fejlen rejses.
+SUPABASE_RETRIES = int(
+    os.getenv(
+        "SUPABASE_RETRIES",
+        "3",
+    )
+)
+
+# Værdier pr. in.(...)-filter ved select_in. 200
+# nummerplader giver en URL på godt 2 KB.
+SUPABASE_IN_BATCH = int(
+    os.getenv(
+        "SUPABASE_IN_BATCH",
+        "200",
+    )
+)
+
+# Tegn, som keyset-intervaller deles på (første tegn
+# i nøglen). Rækker uden for alfabetet kommer stadig
+# med; de havner blot i første eller sidste interval.
+KEY_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+OK_STATUSES = {
+    200,
+    201,
+    204,
+    206,
+}
+
+
+# ============================================================
+# FEJL
+# ============================================================
+
+class SupabaseError(Exception):
+    """
+    Et Supabase-kald fejlede. status er None ved
+    netværksfejl og timeout.
+    """
+
+    def __init__(
+        self,
+        operation,
+        status,
+        body,
+    ):
+
+        self.operation = operation
+
+        self.status = status
+
+        self.body = body
+
+        super().__init__(
+            f"{operation}: "
+            f"{status or 'ingen forbindelse'} "
+            f"{body}".strip()
+        )
+
+
+def retryable(
+    error,
+):
+
+    return (
+        error.status is None
+        or
+        error.status == 429
+        or
+        error.status >= 500
+    )
+
+
+def quote_value(
+    value,
+):
+    """
+    Værdi i dobbelte anførselstegn, så komma, punktum
+    og parenteser ikke læses som PostgREST-syntaks.
+    """
+
+    escaped = str(
+        value
+    ).replace(
+        "\\",
+        "\\\\",
+    ).replace(
+        '"',
+        '\\"',
+    )
+
+    return f'"{escaped}"'
+
+
+def keyset_condition(
+    keys,
+    after,
+):
+    """
+    or-filter for rækker efter after i sorteringen
+    på keys, fx for (plate, company):
+    (plate.gt.X,and(plate.eq.X,company.gt.Y))
+    """
+
+    terms = []
+
+    for position, key in enumerate(
+        keys
+    ):
+
+        parts = [
+
+            f"{keys[earlier]}.eq.{quote_value(after[earlier])}"
+
+            for earlier in range(
+                position
+            )
+        ]
+
+        parts.append(
+            f"{key}.gt.{quote_value(after[position])}"
+        )
+
+        terms.append(
+            parts[0]
+            if len(parts) == 1
+            else f"and({','.join(parts)})"
+        )
+
+    return f"({','.join(terms)})"
+
+
+def key_ranges(
+    parts,
+    alphabet=KEY_ALPHABET,
+):
+    """
+    Deler nøglerummet i parts intervaller
+    [(None, "A"), ("A", "I"), ..., ("S", None)].
+    Intervallerne dækker alt, uanset databasens
+    sortering, fordi grænserne er de samme to
+    sammenligninger (>= og <) på hver side.
+    """
+
+    parts = max(
+        1,
+        min(
+            parts,
+            len(alphabet),
+        ),
+    )
+
+    bounds = [
+        alphabet[
+            len(alphabet) * part // parts
+        ]
+
+        for part in range(
+            1,
+            parts,
+        )
+    ]
+
+    return list(
+        zip(
+            [None] + bounds,
+            bounds + [None],
+        )
+    )
+
+
+# ============================================================
+# KLIENT
+# ============================================================
+
+class SupabaseClient:
+    """
+    Async PostgREST-klient over én keep-alive pool.
+
+        async with SupabaseClient() as supabase:
+            rows = await supabase.select(
+                "plates",
+                columns="plate",
+                filters={"date": "gte.2026-01-01"},
+            )
+
+    Filtre gives som PostgREST-parametre
+    ({"kolonne": "operator.værdi"}). Fejl rejses
+    som SupabaseError.
+    """
+
+    def __init__(
+        self,
+        url=None,
+        key=None,
+        timeout=None,
+        connections=None,
+    ):
+
+        self.url = (
+            url
+            or SUPABASE_URL
+        ).rstrip("/")
+
+        self.key = (
+            key
+            or SUPABASE_SERVICE_ROLE_KEY
+        )
+
+        self.timeout = (
+            timeout
+            or SUPABASE_TIMEOUT
+        )
+
+        self.connections = (
+            connections
+            or SUPABASE_CONNECTIONS
+        )
+
+        self.session = None
+
+        # Latens og fejl pr. operation.
+        self.metrics = {}
+
+    @property
+    def configured(self):
+
+        return bool(
+            self.url
+            and
+            self.key
+        )
+
+    async def __aenter__(self):
+
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=self.connections,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=self.timeout
+            ),
+            headers={
+
+                "apikey":
+                    self.key,
+
+                "Authorization":
+                    f"Bearer {self.key}",
+
+                "Content-Type":
+                    "application/json",
+            },
+        )
+
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type,
+        exc,
+        traceback,
+    ):
+
+        await self.session.close()
+
+        self.session = None
+
+        return False
+
+    def observe(
+        self,
+        operation,
+        latency,
+        rows=0,
+        failed=False,
+    ):
+
+        metrics = self.metrics.setdefault(
+            operation,
+            {
+                "calls": 0,
+                "errors": 0,
+                "rows": 0,
+                "latency": 0.0,
+                "max_latency": 0.0,
+            },
+        )
+
+        metrics["calls"] += 1
+
+        metrics["rows"] += rows
+
+        metrics["latency"] += latency
+
+        metrics["max_latency"] = max(
+            metrics["max_latency"],
+            latency,
+        )
+
+        if failed:
+
+            metrics["errors"] += 1
+
+    async def request(
+        self,
+        operation,
+        method,
+        table,
+        params=None,
+        payload=None,
+        prefer=None,
+        headers=None,
+    ):
+        """
+        Ét kald mod /rest/v1/<table>. Returnerer
+        (status, headers, json-body eller None).
+        """
+
+        request_headers = dict(
+            headers or {}
+        )
+
+        if prefer:
+
+            request_headers[
+                "Prefer"
+            ] = prefer
+
+        started = time.perf_counter()
+
+        try:
+
+            async with self.session.request(
+                method,
+                f"{self.url}/rest/v1/{table}",
+                params=params,
+                data=(
+                    dumps(payload)
+                    if payload is not None
+                    else None
+                ),
+                headers=request_headers,
+            ) as response:
+
+                if response.status not in OK_STATUSES:
+
+                    body = await response.text()
+
+                    self.observe(
+                        operation,
+                        time.perf_counter() - started,
+                        failed=True,
+                    )
+
+                    raise SupabaseError(
+                        operation,
+                        response.status,
+                        body,
+                    )
+
+                raw = await response.read()
+
+                body = (
+                    loads(raw)
+                    if raw.strip()
+                    and response.content_type == "application/json"
+                    else None
+                )
+
+                status = response.status
+
+                response_headers = response.headers
+
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+        ) as error:
+
+            self.observe(
+                operation,
+                time.perf_counter() - started,
+                failed=True,
+            )
+
+            raise SupabaseError(
+                operation,
+                None,
+                str(error) or type(error).__name__,
+            ) from error
+
+        self.observe(
+            operation,
+            time.perf_counter() - started,
+            rows=(
+                len(body)
+                if isinstance(body, list)
+                else len(payload)
+                if isinstance(payload, list)
+                else 0
+            ),
+        )
+
+        return (
+            status,
+            response_headers,
+            body,
+        )
+
+    async def select(
+        self,
+        table,
+        columns="*",
+        filters=None,
+        order=None,
+        limit=None,
+        offset=None,
+        retries=None,
+    ):
+
+        """
+        Et filter kan være en liste, fx
+        {"plate": ["gte.A", "lt.M"]}; PostgREST
+        kræver så alle. Netværksfejl, 429 og 5xx
+        prøves igen med backoff.
+        """
+
+        params = [
+            (
+                "select",
+                columns,
+            ),
+        ]
+
+        for column, value in (
+            filters or {}
+        ).items():
+
+            for condition in (
+                value
+                if isinstance(value, (list, tuple))
+                else [value]
+            ):
+
+                params.append(
+                    (
+                        column,
+                        condition,
+                    )
+                )
+
+        if order:
+
+            params.append(
+                (
+                    "order",
+                    order,
+                )
+            )
+
+        if limit is not None:
+
+            params.append(
+                (
+                    "limit",
+                    str(limit),
+                )
+            )
+
+        if offset:
+
+            params.append(
+                (
+                    "offset",
+                    str(offset),
+                )
+            )
+
+        retries = (
+            SUPABASE_RETRIES
+            if retries is None
+            else retries
+        )
+
+        for attempt in range(
+            retries + 1
+        ):
+
+            try:
+
+                _, _, rows = await self.request(
+                    "select",
+                    "GET",
+                    table,
+                    params=params,
+                )
+
+                return rows or []
+
+            except SupabaseError as error:
+
+                if (
+                    attempt == retries
+                    or
+                    not retryable(error)
+                ):
+
+                    raise
+
+            await asyncio.sleep(
+                backoff_delay(
+                    attempt
+                )
+            )
+
+    async def pages(
+        self,
+        table,
+        columns="*",
+        filters=None,
+        order=None,
+        page_size=None,
+    ):
+        """
+        Async generator med én liste rækker pr. side.
+        """
+
+        page_size = (
+            page_size
+            or SUPABASE_PAGE_SIZE
+        )
+
+        offset = 0
+
+        while True:
+
+            rows = await self.select(
+                table,
+                columns,
+                filters,
+                order,
+                limit=page_size,
+                offset=offset,
+            )
+
+            if rows:
+
+                yield rows
+
+            if len(rows) < page_size:
+
+                return
+
+            offset += page_size
+
+    async def keyset_pages(
+        self,
+        table,
+        key,
+        columns="*",
+        filters=None,
+        page_size=None,
+        lower=None,
+        upper=None,
+    ):
+        """
+        Async generator med sider ordnet på key, hvor
+        hver side starter efter sidste nøgle i den
+        forrige (key > sidste). Databasen slår op i
+        indekset i stedet for at tælle et offset
+        forbi, så sene sider er lige så billige som
+        den første. lower/upper afgrænser [lower,
+        upper) på første nøgle.
+
+        key skal være unik; ellers gives en tuple af
+        kolonner, der tilsammen er, fx
+        ("plate", "company").
+        """
+
+        page_size = (
+            page_size
+            or SUPABASE_PAGE_SIZE
+        )
+
+        keys = (
+            (key,)
+            if isinstance(key, str)
+            else tuple(key)
+        )
+
+        if columns != "*":
+
+            columns = ",".join(
+                columns.split(",")
+                + [
+                    name
+                    for name in keys
+                    if name not in columns.split(",")
+                ]
+            )
+
+        order = ",".join(
+
+            f"{name}.asc"
+
+            for name in keys
+        )
+
+        filters = dict(
+            filters or {}
+        )
+
+        after = None
+
+        while True:
+
+            bounds = []
+
+            if after is not None:
+
+                if len(keys) == 1:
+
+                    bounds.append(
+                        f"gt.{after[0]}"
+                    )
+
+                else:
+
+                    filters["or"] = keyset_condition(
+                        keys,
+                        after,
+                    )
+
+            elif lower is not None:
+
+                bounds.append(
+                    f"gte.{lower}"
+                )
+
+            if upper is not None:
+
+                bounds.append(
+                    f"lt.{upper}"
+                )
+
+            if bounds:
+
+                filters[keys[0]] = bounds
+
+            rows = await self.select(
+                table,
+                columns,
+                filters,
+                order=order,
+                limit=page_size,
+            )
+
+            if rows:
+
+                yield rows
+
+            if len(rows) < page_size:
+
+                return
+
+            after = [
+
+                rows[-1][name]
+
+                for name in keys
+            ]
+
+    async def select_by_key(
+        self,
+        table,
+        key,
+        columns="*",
+        filters=None,
+        page_size=None,
+        parts=1,
+    ):
+        """
+        Alle rækker via keyset-sider. Med parts > 1
+        deles nøglerummet i intervaller, der hentes
+        samtidigt over poolen. Rejser SupabaseError,
+        hvis en side stadig fejler efter retries, så
+        et ufuldstændigt resultat aldrig returneres.
+        """
+
+        async def fetch(
+            lower,
+            upper,
+        ):
+
+            rows = []
+
+            async for page in self.keyset_pages(
+                table,
+                key,
+                columns,
+                filters,
+                page_size,
+                lower,
+                upper,
+            ):
+
+                rows.extend(
+                    page
+                )
+
+            return rows
+
+        try:
+
+            async with asyncio.TaskGroup() as group:
+
+                tasks = [
+
+                    group.create_task(
+                        fetch(
+                            lower,
+                            upper,
+                        )
+                    )
+
+                    for lower, upper in key_ranges(
+                        parts
+                    )
+                ]
+
+        except* SupabaseError as errors:
+
+            raise errors.exceptions[0]
+
+        return [
+
+            row
+
+            for task in tasks
+
+            for row in task.result()
+        ]
+
+    async def select_in(
+        self,
+        table,
+        key,
+        values,
+        columns="*",
+        batch_size=None,
+    ):
+        """
+        Rækker hvor key er en af values, hentet med
+        key=in.(...) i bidder. Bidderne sendes
+        samtidigt; poolen begrænser, hvor mange der
+        er i luften. Rejser SupabaseError som
+        select_by_key.
+        """
+
+        batch_size = (
+            batch_size
+            or SUPABASE_IN_BATCH
+        )
+
+        values = sorted(
+            set(values)
+        )
+
+        def in_filter(
+            batch,
+        ):
+
+            quoted = ",".join(
+
+                quote_value(
+                    value
+                )
+
+                for value in batch
+            )
+
+            return {
+                key: f"in.({quoted})",
+            }
+
+        try:
+
+            async with asyncio.TaskGroup() as group:
+
+                tasks = [
+
+                    group.create_task(
+                        self.select(
+                            table,
+                            columns,
+                            in_filter(
+                                values[
+                                    start:
+                                    start + batch_size
+                                ]
+                            ),
+                        )
+                    )
+
+                    for start in range(
+                        0,
+                        len(values),
+                        batch_size,
+                    )
+                ]
+
+        except* SupabaseError as errors:
+
+            raise errors.exceptions[0]
+
+        return [
+
+            row
+
+            for task in tasks
+
+            for row in task.result()
+        ]
+
+    async def count(
+        self,
+        table,
+        filters=None,
+        exact=False,
+    ):
+        """
+        Postgres' estimat af antal rækker (billigt,
+        også på store tabeller), eller det præcise
+        antal med exact=True. None, hvis svaret
+        ikke indeholder et antal.
+        """
+
+        _, headers, _ = await self.request(
+            "count",
+            "HEAD",
+            table,
+            params={
+                "select": "*",
+                "limit": "0",
+                **(filters or {}),
+            },
+            prefer=(
+                "count=exact"
+                if exact
+                else "count=estimated"
+            ),
+        )
+
+        total = headers.get(
+            "Content-Range",
+            "",
+        ).rpartition(
+            "/"
+        )[2]
+
+        return (
+            int(total)
+            if total.isdigit()
+            else None
+        )
+
+    async def select_all(
+        self,
+        table,
+        columns="*",
+        filters=None,
+        order=None,
+        page_size=None,
+    ):
+
+        rows = []
+
+        async for page in self.pages(
+            table,
+            columns,
+            filters,
+            order,
+            page_size,
+        ):
+
+            rows.extend(
+                page
+            )
+
+        return rows
+
+    async def upsert(
+        self,
+        table,
+        rows,
+        on_conflict=None,
+        ignore_duplicates=True,
+        chunk_size=None,
+    ):
+        """
+        Multi-row upsert i bidder. Returnerer antal
+        rækker sendt; rejser ved første fejlede bid.
+        """
+
+        chunk_size = (
+            chunk_size
+            or SUPABASE_UPSERT_CHUNK
+        )
+
+        params = (
+            {"on_conflict": on_conflict}
+            if on_conflict
+            else None
+        )
+
+        prefer = (
+            "resolution=ignore-duplicates,"
+            if ignore_duplicates
+            else "resolution=merge-duplicates,"
+        ) + "return=minimal"
+
+        sent = 0
+
+        for start in range(
+            0,
+            len(rows),
+            chunk_size,
+        ):
+
+            chunk = rows[
+                start:
+                start + chunk_size
+            ]
+
+            try:
+
+                await self.request(
+                    "upsert",
+                    "POST",
+                    table,
+                    params=params,
+                    payload=chunk,
+                    prefer=prefer,
+                )
+
+            except SupabaseError as error:
+
+                # 409 betyder, at rækkerne allerede findes.
+                if error.status != 409:
+
+                    raise
+
+            sent += len(
+                chunk
+            )
+
+        return sent
+
+    async def delete(
+        self,
+        table,
+        filters,
+    ):
+
+        if not filters:
+
+            raise ValueError(
+                "delete kræver mindst ét filter."
+            )
+
+        await self.request(
+            "delete",
+            "DELETE",
+            table,
+            params=filters,
+            prefer="return=minimal",
+        )
+
+    def describe(self):
+
+        return [
+
+            f"{operation}: {metrics['calls']} kald | "
+            f"{metrics['rows']} rækker | "
+            "latens gns. "
+            f"{metrics['latency'] / metrics['calls'] * 1000:.0f} ms, "
+            f"max {metrics['max_latency'] * 1000:.0f} ms | "
+            f"fejl {metrics['errors']}"
+
+            for operation, metrics in self.metrics.items()
+        ]